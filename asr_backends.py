@@ -0,0 +1,152 @@
+"""
+Speech recognition backends used by the transcriber. The backend is chosen
+with models.asr_backend in config.yaml and tuned under models.asr.
+
+Every backend takes float32 mono audio at 16 kHz and offers:
+  transcribe(audio)           -> text
+  transcribe_batch(audios)    -> list of texts
+Their libraries are imported when the backend is created, so only the
+selected engine has to be installed.
+"""
+import os
+
+class WhisperBackend:
+    """The reference openai-whisper model running on PyTorch."""
+    name = "openai-whisper"
+
+    def __init__(self, model_name, asr_config):
+        import torch
+        import whisper
+        self.torch = torch
+        self.whisper = whisper
+
+        device = asr_config['device']
+        self.device = ("cuda" if torch.cuda.is_available() else "cpu") if device == "auto" else device
+        if self.device == "cpu" and asr_config['cpu_threads'] > 0:
+            torch.set_num_threads(asr_config['cpu_threads'])
+        # Whisper uses greedy decoding unless a beam size is given.
+        self.beam_size = asr_config['beam_size'] if asr_config['beam_size'] > 1 else None
+        if asr_config['weights_cache']:
+            self.model = self.load_cached(model_name, asr_config['weights_cache'])
+        else:
+            self.model = whisper.load_model(model_name, device=self.device)
+
+    def load_cached(self, model_name, cache_dir):
+        """
+        Loads the model from a copy of its weights that is memory-mapped
+        instead of read: a restart skips deserializing the checkpoint and
+        converting it to the dtype the model runs in, and on the CPU every
+        process shares the weights through the page cache. The copy holds only
+        tensors and the model's dimensions, so it loads with weights_only and
+        runs no pickled code. It is written on first use.
+        """
+        torch, whisper = self.torch, self.whisper
+        path = os.path.join(cache_dir, f"{os.path.basename(model_name)}-weights.pt")
+        if not os.path.exists(path):
+            print(f"[*] Caching '{model_name}' as {path} for faster restarts...")
+            model = whisper.load_model(model_name, device="cpu")
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = path + ".tmp"
+            state = model.state_dict()
+            # Non-persistent buffers (the decoder's mask, the alignment heads load_model sets
+            # per model) are not in the state dict. weights_only can't load sparse tensors.
+            buffers = {name: buffer for name, buffer in model.named_buffers() if name not in state}
+            torch.save({
+                "dims": vars(model.dims),
+                "model_state_dict": state,
+                "buffers": {name: buffer.to_dense() for name, buffer in buffers.items()},
+                "sparse_buffers": [name for name, buffer in buffers.items() if buffer.is_sparse],
+            }, tmp_path)
+            os.replace(tmp_path, path)
+            return model.to(self.device)
+
+        checkpoint = torch.load(path, map_location="cpu", weights_only=True, mmap=True)
+        dims = whisper.model.ModelDimensions(**checkpoint["dims"])
+        # Whisper() would allocate and randomly initialize every weight only for them to be
+        # replaced, and its sparse alignment heads can't be built on the meta device. So the
+        # model is put together from weightless parts, and the cached tensors are assigned
+        # to it as they are: memory-mapped, not copied.
+        model = whisper.model.Whisper.__new__(whisper.model.Whisper)
+        torch.nn.Module.__init__(model)
+        model.dims = dims
+        with torch.device("meta"):
+            model.encoder = whisper.model.AudioEncoder(
+                dims.n_mels, dims.n_audio_ctx, dims.n_audio_state, dims.n_audio_head, dims.n_audio_layer)
+            model.decoder = whisper.model.TextDecoder(
+                dims.n_vocab, dims.n_text_ctx, dims.n_text_state, dims.n_text_head, dims.n_text_layer)
+        model.load_state_dict(checkpoint["model_state_dict"], assign=True)
+        for name, buffer in checkpoint["buffers"].items():
+            module_name, _, buffer_name = name.rpartition(".")
+            if name in checkpoint["sparse_buffers"]:
+                buffer = buffer.to_sparse()
+            model.get_submodule(module_name).register_buffer(buffer_name, buffer, persistent=False)
+        return model.to(self.device)
+
+    def transcribe(self, audio):
+        result = self.model.transcribe(audio, language="en", fp16=(self.device == "cuda"), beam_size=self.beam_size)
+        return result['text'].strip()
+
+    def transcribe_batch(self, audio_batch):
+        """
+        Transcribes several clips with one batched forward pass over their padded
+        mel spectrograms. Whisper decodes 30-second windows, so a single clip or
+        any clip longer than that goes through model.transcribe instead.
+        """
+        if len(audio_batch) == 1:
+            return [self.transcribe(audio_batch[0])]
+
+        whisper = self.whisper
+        texts = [None] * len(audio_batch)
+        short = []
+        for i, audio in enumerate(audio_batch):
+            if len(audio) <= whisper.audio.N_SAMPLES:
+                short.append(i)
+            else:
+                texts[i] = self.transcribe(audio)
+
+        if short:
+            mels = self.torch.stack([
+                whisper.log_mel_spectrogram(whisper.pad_or_trim(audio_batch[i]), n_mels=self.model.dims.n_mels, device=self.model.device)
+                for i in short
+            ])
+            options = whisper.DecodingOptions(language="en", fp16=(self.device == "cuda"), without_timestamps=True,
+                                              beam_size=self.beam_size)
+            for i, result in zip(short, whisper.decode(self.model, mels, options)):
+                texts[i] = result.text.strip()
+        return texts
+
+class FasterWhisperBackend:
+    """
+    Whisper converted to CTranslate2 (faster-whisper). With compute_type int8
+    it runs several times faster than openai-whisper on CPU-only machines.
+    """
+    name = "faster-whisper"
+
+    def __init__(self, model_name, asr_config):
+        import ctranslate2
+        from faster_whisper import WhisperModel
+
+        device = asr_config['device']
+        if device == "auto":
+            device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+        self.device = device
+        self.beam_size = max(1, asr_config['beam_size'])
+        self.model = WhisperModel(model_name, device=device, compute_type=asr_config['compute_type'],
+                                  cpu_threads=asr_config['cpu_threads'])
+
+    def transcribe(self, audio):
+        segments, _ = self.model.transcribe(audio, language="en", beam_size=self.beam_size)
+        # Segments are generated lazily; decoding happens while joining them.
+        return "".join(segment.text for segment in segments).strip()
+
+    def transcribe_batch(self, audio_batch):
+        # CTranslate2 already spreads one decode over cpu_threads.
+        return [self.transcribe(audio) for audio in audio_batch]
+
+BACKENDS = {backend.name: backend for backend in (WhisperBackend, FasterWhisperBackend)}
+
+def load_asr_backend(backend_name, model_name, asr_config):
+    """Creates the configured backend. Raises ValueError for an unknown name."""
+    if backend_name not in BACKENDS:
+        raise ValueError(f"Unknown ASR backend '{backend_name}'. Choose one of: {', '.join(BACKENDS)}")
+    return BACKENDS[backend_name](model_name, asr_config)
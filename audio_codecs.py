@@ -0,0 +1,157 @@
+"""
+Audio codecs for the mic -> transcriber link.
+
+The mic lists the codecs it would like to use in its hello frame, most
+preferred first, and the transcriber answers with the first one it can
+decode. Every codec works on 16 kHz mono int16 PCM:
+  pcm16 - raw samples, no compression.
+  flac  - lossless, through soundfile (libsndfile). Each frame is a small,
+          self-contained FLAC stream.
+  opus  - lossy speech codec from the optional opuslib package. Much smaller
+          than FLAC; the encoder and decoder keep state for the connection.
+Decoders return float32 samples in [-1, 1) as the ASR backends expect,
+converted in one pass without an intermediate float array.
+
+A codec object belongs to one connection and one direction.
+"""
+import io
+import struct
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+class CodecError(ValueError):
+    """Raised when a payload can't be decoded."""
+
+def pcm_to_float(data):
+    """Converts raw int16 PCM bytes to float32 samples in a single pass."""
+    samples = np.frombuffer(data, dtype=np.int16)
+    return np.multiply(samples, 1 / 32768.0, dtype=np.float32)
+
+class Pcm16Codec:
+    name = "pcm16"
+
+    @staticmethod
+    def available():
+        return True
+
+    def encode(self, pcm):
+        return pcm
+
+    def flush(self):
+        """Returns any audio still held by the encoder at the end of an utterance."""
+        return b""
+
+    def decode(self, payload):
+        if len(payload) % 2:
+            raise CodecError("PCM payload has an odd number of bytes.")
+        return pcm_to_float(payload)
+
+class FlacCodec:
+    name = "flac"
+
+    @staticmethod
+    def available():
+        try:
+            import soundfile
+            return True
+        except (ImportError, OSError): # OSError: libsndfile itself is missing
+            return False
+
+    def __init__(self):
+        import soundfile
+        self.soundfile = soundfile
+
+    def encode(self, pcm):
+        buffer = io.BytesIO()
+        self.soundfile.write(buffer, np.frombuffer(pcm, dtype=np.int16), SAMPLE_RATE, format="FLAC", subtype="PCM_16")
+        return buffer.getvalue()
+
+    def flush(self):
+        return b""
+
+    def decode(self, payload):
+        try:
+            # libsndfile converts straight to float32 while decoding.
+            audio, _ = self.soundfile.read(io.BytesIO(payload), dtype="float32")
+        except RuntimeError as e:
+            raise CodecError(f"Invalid FLAC payload: {e}")
+        return audio
+
+class OpusCodec:
+    """
+    Opus only encodes whole 20 ms frames, so leftover samples are carried over
+    to the next call and padded with silence by flush(). A payload is a run
+    of packets, each prefixed with its 2-byte length.
+    """
+    name = "opus"
+    FRAME_SAMPLES = SAMPLE_RATE // 50
+    PACKET_HEADER = struct.Struct('>H')
+
+    @staticmethod
+    def available():
+        try:
+            import opuslib
+            return True
+        except Exception: # opuslib raises a plain Exception when libopus itself is missing
+            return False
+
+    def __init__(self, bitrate=24000):
+        import opuslib
+        self.opuslib = opuslib
+        self.encoder = opuslib.Encoder(SAMPLE_RATE, 1, opuslib.APPLICATION_VOIP)
+        self.encoder.bitrate = bitrate
+        self.decoder = opuslib.Decoder(SAMPLE_RATE, 1)
+        self.leftover = b""
+
+    def _encode_frames(self, pcm):
+        frame_bytes = self.FRAME_SAMPLES * 2
+        packets = []
+        for start in range(0, len(pcm) - frame_bytes + 1, frame_bytes):
+            packet = self.encoder.encode(pcm[start:start + frame_bytes], self.FRAME_SAMPLES)
+            packets.append(self.PACKET_HEADER.pack(len(packet)) + packet)
+        return b"".join(packets)
+
+    def encode(self, pcm):
+        pcm = self.leftover + bytes(pcm)
+        whole = len(pcm) - len(pcm) % (self.FRAME_SAMPLES * 2)
+        self.leftover = pcm[whole:]
+        return self._encode_frames(pcm[:whole])
+
+    def flush(self):
+        if not self.leftover:
+            return b""
+        pcm = self.leftover.ljust(self.FRAME_SAMPLES * 2, b"\0")
+        self.leftover = b""
+        return self._encode_frames(pcm)
+
+    def decode(self, payload):
+        payload = memoryview(payload)
+        pcm = []
+        offset = 0
+        try:
+            while offset < len(payload):
+                (length,) = self.PACKET_HEADER.unpack_from(payload, offset)
+                offset += self.PACKET_HEADER.size
+                pcm.append(self.decoder.decode(bytes(payload[offset:offset + length]), self.FRAME_SAMPLES))
+                offset += length
+        except (struct.error, self.opuslib.OpusError) as e:
+            raise CodecError(f"Invalid Opus payload: {e}")
+        return pcm_to_float(b"".join(pcm))
+
+CODECS = {codec.name: codec for codec in (Pcm16Codec, FlacCodec, OpusCodec)}
+
+def choose_codec(offered):
+    """Returns the first offered codec this side supports, falling back to pcm16."""
+    for name in offered:
+        if name in CODECS and CODECS[name].available():
+            return name
+    return Pcm16Codec.name
+
+def load_codec(name, opus_bitrate=24000):
+    """Creates a codec for one connection. Raises ValueError for an unknown name."""
+    if name not in CODECS:
+        raise ValueError(f"Unknown audio codec '{name}'. Choose one of: {', '.join(CODECS)}")
+    if name == OpusCodec.name:
+        return OpusCodec(opus_bitrate)
+    return CODECS[name]()
@@ -1,13 +1,21 @@
 #!/home/nischay/linenv311/bin/python
-import socket
-import struct
-import threading
-import requests
+import asyncio
+import aiohttp
 import json
-import time
 import yaml
 import sys
 import re
+import time
+import threading
+from framing import FrameTooLarge, encode_frame, read_text_async
+from response_cache import ResponseCache
+from conversation import Conversation, is_self_contained, summary_prompt
+from sentences import SentenceSplitter
+from tracing import TraceCollector
+
+FALLBACK_RESPONSE = "I'm sorry, I encountered an error."
+# Said right before a wake word ("Hey Brian"); part of the wake word, not the command.
+WAKE_GREETINGS = ["hey", "hi", "hello", "ok", "okay"]
 
 def load_config():
     """Loads the main configuration file."""
@@ -18,76 +26,173 @@ def load_config():
         print("[!!!] CRITICAL: config.yaml not found.")
         sys.exit(1)
 
+class ServiceConnection:
+    """
+    Outbound connection to a peer service. Messages are queued by send() and
+    written by a single writer task, so frames from concurrent conversations
+    never interleave. The writer reconnects on failure and resends the frame
+    that was in flight. Frames the peer sends back go to on_message.
+    """
+    def __init__(self, name, host, port, on_message=None):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.on_message = on_message
+        self.outbox = asyncio.Queue()
+        self.writer = None
+        self.listener = None
+
+    def send(self, text):
+        """Queues text for the peer. Never blocks."""
+        self.outbox.put_nowait(encode_frame(text.encode('utf-8')))
+
+    async def connect(self):
+        """Connects to the peer, retrying with a growing delay until it is reachable."""
+        delay = 0.25
+        while True:
+            try:
+                print(f"[*] Central connecting to {self.name} at {self.host}:{self.port}...")
+                reader, self.writer = await asyncio.open_connection(self.host, self.port)
+                print(f"[+] Central connected to {self.name}.")
+                if self.on_message is not None:
+                    self.listener = asyncio.create_task(self.listen(reader))
+                return
+            except OSError as e:
+                print(f"[!] Connection to {self.name} failed: {e}. Retrying in {delay:g}s...")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 3)
+
+    async def run(self):
+        """The writer task: drains the outbox for as long as the service runs."""
+        await self.connect()
+        try:
+            while True:
+                frame = await self.outbox.get()
+                while True:
+                    try:
+                        self.writer.write(frame)
+                        await self.writer.drain()
+                        break
+                    except (ConnectionError, OSError):
+                        print(f"[!] {self.name} disconnected. Reconnecting...")
+                        self.writer.close()
+                        await self.connect()
+        finally:
+            if self.listener is not None:
+                self.listener.cancel()
+            if self.writer is not None:
+                self.writer.close()
+
+    async def listen(self, reader):
+        """Passes every frame the peer sends to on_message until the connection closes."""
+        try:
+            while True:
+                text = await read_text_async(reader)
+                if text is None: break
+                self.on_message(text)
+        except (ConnectionError, FrameTooLarge) as e:
+            print(f"[!] Stopped reading from {self.name}: {e}")
+
+class LocalConnection:
+    """
+    ServiceConnection's stand-in for a peer hosted in the same process
+    (monolith mode). send() hands the text straight to the peer's endpoint;
+    what the peer sends back is read by a thread and passed to on_message
+    on the event loop.
+    """
+    def __init__(self, name, endpoint, on_message=None):
+        self.name = name
+        self.endpoint = endpoint
+        self.on_message = on_message
+
+    def send(self, text):
+        """Hands text to the peer. Never blocks."""
+        self.endpoint.send(text)
+
+    async def run(self):
+        if self.on_message is not None:
+            loop = asyncio.get_running_loop()
+            threading.Thread(target=self.listen, args=(loop,), name=f"{self.name}-listener", daemon=True).start()
+        print(f"[+] Central linked to {self.name} in-process.")
+
+    def listen(self, loop):
+        for text in self.endpoint:
+            loop.call_soon_threadsafe(self.on_message, text)
+
+def connect_peer(name, endpoint, host, port, on_message=None):
+    """An in-process connection when the peer's endpoint is given, otherwise TCP."""
+    if endpoint is not None:
+        return LocalConnection(name, endpoint, on_message)
+    return ServiceConnection(name, host, port, on_message)
+
 class CentralOrchestrator:
-    def __init__(self, config):
+    def __init__(self, config, links=None):
+        """
+        links maps "transcriber", "speaker", "session" and "ui" to endpoints
+        of services hosted in the same process (see monolith.py). Services
+        without one are reached over TCP.
+        """
         self.config = config
-        self.is_awake = False
+        links = links or {}
+        # Wake state is tracked per mic, so each room wakes up on its own.
+        self.awake_sources = set()
+        # Send functions of the transcriber connections, which are told whenever a
+        # mic wakes up or goes to sleep.
+        self.transcriber_senders = set()
+        self.transcriber_link = links.get("transcriber")
+        self.wake_word_heard = set()
+        # The running LLM task of each mic, so it can be cancelled.
+        self.llm_tasks = {}
+        # Rolling LLM context of each mic's conversation.
+        self.conversations = {}
+        # Background warm-up requests started on a wake word, per mic.
+        self.warmup_tasks = {}
+        # First-token latency of commands sent to a cold or a warmed-up model.
+        self.first_token_latency = {"cold": [], "warm": []}
+        self.http = None
         
         # --- Load Configuration with Validation ---
         try:
             self.wake_words = self.config['wake_words']
+            # Any wake word as a whole word (not "Brian's"), with a greeting before it and the
+            # punctuation that follows it.
+            self.wake_pattern = re.compile(
+                r"(?:\b(?:" + "|".join(WAKE_GREETINGS) + r")[\s,]+)?"
+                r"\b(?:" + "|".join(re.escape(word) for word in self.wake_words) + r")(?![\w'’])[\s,.!?:;-]*",
+                re.IGNORECASE)
             
             central_ports = self.config['ports']['central']
             self.transcriber_listen_host = central_ports['transcriber_host']
             self.transcriber_listen_port = central_ports['transcriber_port']
-            self.speaker_connect_host = central_ports['speaker_host']
-            self.speaker_connect_port = central_ports['speaker_port']
-            self.session_connect_host = central_ports['session_host']
-            self.session_connect_port = central_ports['session_port']
-            self.ui_connect_host = central_ports['ui_host']
-            self.ui_connect_port = central_ports['ui_port']
+            self.speaker = connect_peer("Speaker", links.get("speaker"), central_ports['speaker_host'],
+                                        central_ports['speaker_port'], on_message=self.handle_speaker_message)
+            self.session = connect_peer("Session Manager", links.get("session"), central_ports['session_host'],
+                                        central_ports['session_port'])
+            self.ui = connect_peer("UI", links.get("ui"), central_ports['ui_host'], central_ports['ui_port'])
 
             model_config = self.config['models']
             self.ollama_model = model_config['ollama']
             self.ollama_endpoint = model_config['ollama_endpoint']
+            self.ollama_stream = model_config['ollama_stream']
+            self.ollama_keep_alive = model_config['ollama_keep_alive']
+
+            cache_config = self.config['response_cache']
+            self.cache = ResponseCache(cache_config) if cache_config['enabled'] else None
+            self.embedding_model = cache_config['embedding_model']
+            self.embedding_endpoint = cache_config['embedding_endpoint']
+
+            self.conversation_config = self.config['conversation']
+            # A conversation is forgotten when the session manager would start a new session.
+            self.conversation_timeout = self.config['session']['timeout_minutes'] * 60
+
+            tracing_config = self.config['tracing']
+            self.tracer = TraceCollector(tracing_config) if tracing_config['enabled'] else None
+            self.trace_export_interval = tracing_config['export_interval_seconds']
 
         except KeyError as e:
             print(f"[!!!] CRITICAL: Missing configuration in config.yaml. Key not found: {e}")
             sys.exit(1)
 
-        # Sockets
-        self.speaker_sock = self.connect_to_service("Speaker", self.speaker_connect_host, self.speaker_connect_port)
-        self.session_sock = self.connect_to_service("Session Manager", self.session_connect_host, self.session_connect_port)
-        self.ui_sock = self.connect_to_service("UI", self.ui_connect_host, self.ui_connect_port)
-
-    def connect_to_service(self, name, host, port):
-        """Generic connection function with retries."""
-        while True:
-            try:
-                print(f"[*] Central connecting to {name} at {host}:{port}...")
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.connect((host, port))
-                print(f"[+] Central connected to {name}.")
-                return sock
-            except Exception as e:
-                print(f"[!] Connection to {name} failed: {e}. Retrying...")
-                time.sleep(3)
-
-    def send_with_reconnect(self, sock, service_name, host, port, data):
-        """Sends data and handles reconnection on failure."""
-        try:
-            sock.sendall(data)
-            return sock
-        except (socket.error, BrokenPipeError):
-            print(f"[!] {service_name} disconnected. Reconnecting...")
-            sock.close()
-            new_sock = self.connect_to_service(service_name, host, port)
-            new_sock.sendall(data)
-            return new_sock
-
-    def send_length_prefixed(self, service_name, text):
-        """Encodes text and sends it with a 4-byte length prefix to the correct service."""
-        encoded_text = text.encode('utf-8')
-        length_prefix = struct.pack('>I', len(encoded_text))
-        data_to_send = length_prefix + encoded_text
-        
-        if service_name == "Speaker":
-            self.speaker_sock = self.send_with_reconnect(self.speaker_sock, "Speaker", self.speaker_connect_host, self.speaker_connect_port, data_to_send)
-        elif service_name == "Session Manager":
-            self.session_sock = self.send_with_reconnect(self.session_sock, "Session Manager", self.session_connect_host, self.session_connect_port, data_to_send)
-        elif service_name == "UI":
-            self.ui_sock = self.send_with_reconnect(self.ui_sock, "UI", self.ui_connect_host, self.ui_connect_port, data_to_send)
-
     def clean_text_for_speech(self, text):
         """
         Removes symbols that are poorly handled by TTS, while keeping
@@ -97,104 +202,467 @@ class CentralOrchestrator:
         cleaned_text = re.sub(r'\s+', ' ', cleaned_text).strip()
         return cleaned_text
 
-    def llm_worker(self, command_text):
+    def llm_payload(self, prompt, context, stream):
+        payload = {"model": self.ollama_model, "prompt": prompt, "stream": stream, "keep_alive": self.ollama_keep_alive}
+        if context is not None:
+            payload["context"] = context
+        return payload
+
+    def speak(self, text, trace_id=None):
+        """Sends text to the speaker. Traced text goes as JSON, so the speaker can report its spans."""
+        if trace_id is None:
+            self.speaker.send(text)
+        else:
+            # Speech text never starts with "{", so the speaker can tell the two apart.
+            self.speaker.send(json.dumps({"text": text, "trace": trace_id}))
+
+    def record_span(self, trace_id, stage, start, end=None):
+        if self.tracer is not None and trace_id is not None:
+            self.tracer.record(trace_id, {stage: [start, time.time() if end is None else end]})
+
+    async def stream_llm_response(self, prompt, context=None, trace_id=None):
+        """
+        Streams the answer from Ollama and forwards every sentence to the UI and
+        the speaker as soon as it is complete, so speech of the first sentence
+        overlaps with generation of the rest. Returns the full answer, the
+        context Ollama sent with the last chunk and the first-token latency.
+        """
+        payload = self.llm_payload(prompt, context, stream=True)
+        splitter = SentenceSplitter()
+        tokens = []
+        speaking = False
+        new_context = first_token = None
+        started = time.perf_counter()
+
+        def forward(sentences):
+            nonlocal speaking
+            for sentence in sentences:
+                self.ui.send(f"llm_response_chunk:{sentence}")
+                speech_text = self.clean_text_for_speech(sentence)
+                if not speech_text:
+                    continue
+                if not speaking:
+                    speaking = True
+                    self.ui.send(f"llm_status:SPEAKING")
+                self.speak(speech_text, trace_id)
+
+        async with self.http.post(self.ollama_endpoint, json=payload) as response:
+            response.raise_for_status()
+            async for line in response.content:
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise ValueError(chunk["error"])
+
+                token = chunk.get("response", "")
+                if token and first_token is None:
+                    first_token = time.perf_counter() - started
+                tokens.append(token)
+                forward(splitter.feed(token))
+
+                if chunk.get("done"):
+                    new_context = chunk.get("context")
+                    break
+
+        # Also reached when the stream ends without a done chunk; flushing an empty splitter yields nothing.
+        forward(splitter.flush())
+
+        llm_response = "".join(tokens).strip()
+        if not llm_response:
+            llm_response = FALLBACK_RESPONSE
+            self.ui.send(f"llm_response_chunk:{llm_response}")
+            self.speak(llm_response, trace_id)
+        self.ui.send("llm_response_end:")
+        return llm_response, new_context, first_token
+
+    async def generate_llm_response(self, prompt, context=None):
+        """Asks Ollama for the whole answer in one response. Returns it with the new context."""
+        payload = self.llm_payload(prompt, context, stream=False)
+        async with self.http.post(self.ollama_endpoint, json=payload) as response:
+            response.raise_for_status()
+            result = await response.json(content_type=None)
+        return result.get("response", FALLBACK_RESPONSE).strip(), result.get("context")
+
+    def start_warm_up(self, source):
+        """Warms the LLM up in the background as soon as a wake word is heard."""
+        task = self.warmup_tasks.get(source)
+        if task is None or task.done():
+            self.warmup_tasks[source] = asyncio.create_task(self.warm_up_llm(source))
+
+    async def warm_up_llm(self, source):
+        """
+        Loads the model (an empty prompt only loads it) and prefills any history
+        that the next prompt will replay, so Ollama's prompt cache already holds
+        it when the command arrives. Returns True once the model is warm.
+        """
+        history = self.get_conversation(source).history_prompt()
+        payload = self.llm_payload(history, None, stream=False)
+        if history:
+            payload["options"] = {"num_predict": 1}
+        started = time.perf_counter()
+        try:
+            async with self.http.post(self.ollama_endpoint, json=payload) as response:
+                response.raise_for_status()
+                await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"[!] LLM warm-up failed: {e}")
+            return False
+        print(f"[*] LLM warmed up for '{source}' in {time.perf_counter() - started:.2f}s")
+        return True
+
+    def is_warm(self, source):
+        """
+        Whether the mic's warm-up has finished successfully. One still running
+        stays in warmup_tasks, so it isn't started twice and is still cancelled
+        at shutdown.
+        """
+        task = self.warmup_tasks.get(source)
+        if task is None or not task.done():
+            return False
+        del self.warmup_tasks[source]
+        return not task.cancelled() and task.exception() is None and task.result()
+
+    def report_first_token(self, warm, seconds):
+        """Logs the latency of this command next to the running cold/warm averages."""
+        label = "warm" if warm else "cold"
+        self.first_token_latency[label].append(seconds)
+        averages = ", ".join(
+            f"{name} avg {sum(samples) / len(samples):.2f}s over {len(samples)}"
+            for name, samples in self.first_token_latency.items() if samples
+        )
+        print(f"[*] First token after {seconds:.2f}s ({label} model). {averages}")
+
+    def get_conversation(self, source):
+        """Returns the mic's conversation, starting a new one after a long silence."""
+        conversation = self.conversations.get(source)
+        if conversation is None or time.time() - conversation.last_activity > self.conversation_timeout:
+            conversation = Conversation(self.conversation_config)
+            self.conversations[source] = conversation
+        return conversation
+
+    async def summarize_conversation(self, conversation, source):
+        """Condenses the older turns so the history stays within the token budget."""
+        turns = conversation.turns_to_summarize()
+        try:
+            summary, _ = await self.generate_llm_response(summary_prompt(conversation, turns))
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            # Dropping the turns still keeps the context bounded.
+            print(f"[!] Could not summarize the conversation, dropping older turns: {e}")
+            summary = conversation.summary
+        conversation.apply_summary(summary, len(turns))
+        print(f"[*] Summarized {len(turns)} older turns of the conversation with '{source}'.")
+
+    def deliver_response(self, llm_response, trace_id=None):
+        """Sends a complete answer to the UI and the speaker."""
+        self.ui.send(f"llm_response:{llm_response}")
+
+        speech_text = self.clean_text_for_speech(llm_response)
+        self.ui.send(f"llm_status:SPEAKING")
+        self.speak(speech_text, trace_id)
+
+    async def embed(self, text):
+        """Returns the prompt's embedding from Ollama, or None if similarity lookup is off or fails."""
+        if not self.embedding_model:
+            return None
+        payload = {"model": self.embedding_model, "prompt": text}
+        try:
+            async with self.http.post(self.embedding_endpoint, json=payload) as response:
+                response.raise_for_status()
+                return (await response.json(content_type=None))["embedding"]
+        except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, ValueError) as e:
+            print(f"[!] Embedding request failed, using exact cache lookup only: {e}")
+            return None
+
+    async def llm_worker(self, command_text, source, trace_id=None):
         """Handles the interaction with the Ollama LLM."""
         try:
-            self.send_length_prefixed("UI", f"llm_status:THINKING")
-            
-            payload = {"model": self.ollama_model, "prompt": command_text, "stream": False}
-            response = requests.post(self.ollama_endpoint, json=payload, timeout=60)
-            response.raise_for_status()
-            
-            llm_response = json.loads(response.text).get("response", "I'm sorry, I encountered an error.").strip()
-            
-            self.send_length_prefixed("UI", f"llm_response:{llm_response}")
+            self.ui.send(f"llm_status:THINKING")
+            warm = self.is_warm(source)
+
+            conversation = self.get_conversation(source)
+            prompt, context = conversation.build_prompt(command_text)
+            # Follow-up questions depend on the history, so only a conversation's
+            # opening question and questions that stand on their own are looked up
+            # in (and stored to) the cache.
+            use_cache = self.cache is not None and (conversation.is_empty() or is_self_contained(command_text))
+
+            cached = embedding = new_context = None
+            if use_cache:
+                embedding = await self.embed(command_text)
+                cached = self.cache.get(self.ollama_model, command_text, embedding)
+                print(f"[*] Response cache: {self.cache.describe()}")
+
+            llm_started = time.time()
+            if cached is not None:
+                # A cached answer skips the LLM and goes straight to the speaker.
+                llm_response = cached
+                self.deliver_response(llm_response, trace_id)
+            elif self.ollama_stream:
+                llm_response, new_context, first_token = await self.stream_llm_response(prompt, context, trace_id)
+                if first_token is not None:
+                    self.report_first_token(warm, first_token)
+                    self.record_span(trace_id, "llm_first_token", llm_started, llm_started + first_token)
+                self.record_span(trace_id, "llm", llm_started)
+            else:
+                started = time.perf_counter()
+                llm_response, new_context = await self.generate_llm_response(prompt, context)
+                self.report_first_token(warm, time.perf_counter() - started)
+                self.record_span(trace_id, "llm_first_token", llm_started)
+                self.record_span(trace_id, "llm", llm_started)
+                self.deliver_response(llm_response, trace_id)
+
+            if llm_response != FALLBACK_RESPONSE:
+                conversation.record(command_text, llm_response, new_context)
+                if use_cache and cached is None:
+                    self.cache.put(self.ollama_model, command_text, llm_response, embedding)
+                    await asyncio.to_thread(self.cache.write, self.cache.snapshot())
+
             session_data = json.dumps({"question": command_text, "answer": llm_response})
-            self.send_length_prefixed("Session Manager", session_data)
+            self.session.send(session_data)
 
-            speech_text = self.clean_text_for_speech(llm_response)
-            self.send_length_prefixed("UI", f"llm_status:SPEAKING")
-            self.send_length_prefixed("Speaker", speech_text)
+            # Runs while the speaker is still reading the answer out.
+            if conversation.needs_summary():
+                await self.summarize_conversation(conversation, source)
 
-        except requests.exceptions.RequestException as e:
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             error_msg = f"Error connecting to LLM: {e}"
-            self.send_length_prefixed("UI", f"system_message:{error_msg}")
+            self.ui.send(f"system_message:{error_msg}")
+        except ValueError as e:
+            error_msg = f"Invalid response from LLM: {e}"
+            self.ui.send(f"system_message:{error_msg}")
+        except asyncio.CancelledError:
+            # Close a half-streamed answer on the UI.
+            self.ui.send("llm_response_end:")
+            raise
         finally:
-            self.is_awake = False
-            self.send_length_prefixed("UI", "wake_status:SLEEPING")
-            self.send_length_prefixed("UI", "llm_status:IDLE")
+            self.set_awake(source, False)
+            self.ui.send("wake_status:SLEEPING")
+            self.ui.send("llm_status:IDLE")
 
-    def process_transcription(self, text):
+    def start_llm_task(self, command_text, source, trace_id=None):
+        """
+        Runs llm_worker as a task owned by the mic's source. A new command from
+        the same mic cancels one that is still in progress.
+        """
+        previous = self.llm_tasks.get(source)
+        if previous is not None:
+            previous.cancel()
+        task = asyncio.create_task(self.llm_worker(command_text, source, trace_id))
+        self.llm_tasks[source] = task
+        task.add_done_callback(lambda done: self.llm_tasks.pop(source) if self.llm_tasks.get(source) is done else None)
+
+    def handle_speaker_message(self, message):
+        if message.startswith("STOP:"):
+            asyncio.create_task(self.handle_barge_in(message[len("STOP:"):]))
+        elif message.startswith("{") and self.tracer is not None:
+            try:
+                report = json.loads(message)
+                if report.get("type") == "trace":
+                    self.tracer.record(report["id"], report["spans"])
+            except (json.JSONDecodeError, KeyError, ValueError) as e:
+                print(f"[!] Received a malformed trace report from the speaker: {e}")
+
+    async def handle_barge_in(self, source):
+        """
+        The user talked over the speaker into the mic `source`. Stops that
+        mic's answer, if it is still being generated, and keeps the mic awake,
+        so what the user is saying now is taken as the next command without a
+        wake word. Answers for other mics carry on.
+        """
+        self.ui.send("system_message:Interrupted.")
+        print(f"[!] Barge-in: cancelling the answer for '{source}'.")
+        task = self.llm_tasks.get(source)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        # Sentences sent before the cancel may still be on their way; the speaker
+        # drops text until this fence arrives behind them.
+        self.speaker.send(json.dumps({"type": "fence"}))
+        self.set_awake(source, True)
+        self.ui.send("wake_status:LISTENING")
+
+    def process_partial_transcription(self, text, source):
+        """Shows in-progress speech on the UI and checks it early for a wake word."""
+        self.ui.send(f"partial_transcription:{text}")
+        if source not in self.awake_sources and source not in self.wake_word_heard and self.wake_pattern.search(text):
+            print(f"[*] Wake word heard in partial transcription from '{source}'.")
+            self.wake_word_heard.add(source)
+            self.ui.send("wake_status:LISTENING")
+            self.start_warm_up(source)
+
+    def process_transcription(self, text, source, trace_id=None):
         """Processes transcribed text to check for wake words or commands."""
-        print(f"[*] Processing transcription: '{text}' (Awake state: {self.is_awake})")
-        self.send_length_prefixed("UI", f"user_transcription:{text}")
+        wake_word_heard = source in self.wake_word_heard
+        self.wake_word_heard.discard(source)
+        is_awake = source in self.awake_sources
+        if not text:
+            # Streaming can end in silence; just clear the partial text on the UI.
+            self.ui.send("partial_transcription:")
+            if wake_word_heard and not is_awake:
+                self.ui.send("wake_status:SLEEPING")
+            return
+
+        print(f"[*] Processing transcription from '{source}': '{text}' (Awake state: {is_awake})")
+        self.ui.send(f"user_transcription:{text}")
         
-        if self.is_awake:
+        if is_awake:
             print("[*] Assistant is awake. Treating as a command.")
-            threading.Thread(target=self.llm_worker, args=(text,)).start()
+            self.start_llm_task(text, source, trace_id)
         else:
             print("[*] Assistant is sleeping. Checking for wake word...")
-            if any(word in text for word in self.wake_words):
+            wake_match = self.wake_pattern.search(text)
+            command_text = ""
+            if wake_match:
+                # Only a wake word that opens or closes the utterance ("Brian, what time
+                # is it?", "What time is it, Brian?") comes with a command. One mentioned
+                # mid-sentence ("I told Brian about it") just wakes the assistant up.
+                before, after = text[:wake_match.start()], text[wake_match.end():]
+                if not re.search(r"\w", before):
+                    command_text = after.strip()
+                elif not re.search(r"\w", after):
+                    command_text = before.rstrip(" ,;:-")
+            if wake_match and re.search(r"\w", command_text):
+                print(f"[+] Wake word detected with a command: '{command_text}'")
+                self.set_awake(source, True)
+                self.ui.send("wake_status:LISTENING")
+                self.start_llm_task(command_text, source, trace_id)
+            elif wake_match:
                 print("[+] Wake word detected! Setting state to AWAKE and LISTENING.")
-                self.is_awake = True
-                self.send_length_prefixed("UI", "wake_status:LISTENING")
+                self.set_awake(source, True)
+                self.ui.send("wake_status:LISTENING")
+                self.start_warm_up(source)
             else:
                 print("[-] No wake word detected.")
+                if wake_word_heard:
+                    self.ui.send("wake_status:SLEEPING")
+
+    def set_awake(self, source, awake):
+        """Updates a mic's wake state and pushes it to the transcribers' keyword spotters."""
+        if awake:
+            self.awake_sources.add(source)
+        else:
+            self.awake_sources.discard(source)
+        for send in self.transcriber_senders:
+            self.send_wake_state(send, source, awake)
+
+    def send_wake_state(self, send, source, awake):
+        send(json.dumps({"type": "wake_state", "source": source, "awake": awake}))
+
+    def add_transcriber(self, send):
+        """Registers a transcriber connection and tells it which mics are awake right now."""
+        self.transcriber_senders.add(send)
+        for source in self.awake_sources:
+            self.send_wake_state(send, source, True)
 
-    def handle_transcriber_client(self, conn):
-        """Receives data from the transcriber service."""
+    def handle_transcriber_message(self, data):
+        if not data:
+            return
+        try:
+            message = json.loads(data)
+        except json.JSONDecodeError as e:
+            print(f"[!] Received malformed transcription message: {e}")
+            return
+        source = message.get("source", "default")
+        if message.get("type") == "partial":
+            self.process_partial_transcription(message["text"], source)
+            return
+
+        trace_id = None
+        trace = message.get("trace")
+        if trace is not None and self.tracer is not None:
+            trace_id = trace["id"]
+            self.tracer.record(trace_id, trace["spans"])
+            self.record_span(trace_id, "forward", trace["sent"])
+        self.process_transcription(message["text"], source, trace_id)
+
+    async def handle_transcriber_client(self, reader, writer):
+        """Receives data from the transcriber service and tells it which mics are awake."""
         print("[+] Transcriber client connected.")
+        send = lambda text: writer.write(encode_frame(text.encode('utf-8')))
+        self.add_transcriber(send)
         try:
-            with conn:
-                while True:
-                    length_bytes = conn.recv(4)
-                    if not length_bytes: break
-                    length = struct.unpack('>I', length_bytes)[0]
-                    data = b""
-                    while len(data) < length:
-                        packet = conn.recv(length - len(data))
-                        if not packet: break
-                        data += packet
-                    if data:
-                        self.process_transcription(data.decode('utf-8'))
+            while True:
+                data = await read_text_async(reader)
+                if data is None: break
+                self.handle_transcriber_message(data)
         except (ConnectionResetError, BrokenPipeError):
             print("[-] Transcriber client disconnected.")
+        except FrameTooLarge as e:
+            print(f"[!] Dropping transcriber connection: {e}")
+        finally:
+            self.transcriber_senders.discard(send)
+            writer.close()
 
-    def start(self):
-        """Starts the main listener for the transcriber service."""
-        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    def serve_local_transcriber(self, endpoint):
+        """Links the in-process transcriber: its messages are read by a thread and handled on the loop."""
+        loop = asyncio.get_running_loop()
+        self.add_transcriber(endpoint.send)
+        def listen():
+            for data in endpoint:
+                loop.call_soon_threadsafe(self.handle_transcriber_message, data)
+        threading.Thread(target=listen, name="transcriber-listener", daemon=True).start()
+        print("[+] Central linked to the transcriber in-process.")
 
-        # --- Add retry logic for binding the socket ---
+    async def start_transcriber_server(self):
+        """Binds the listener for the transcriber service, retrying while the port is busy."""
         for i in range(10): # Retry for 10 seconds
             try:
-                server_socket.bind((self.transcriber_listen_host, self.transcriber_listen_port))
-                server_socket.listen()
+                server = await asyncio.start_server(self.handle_transcriber_client, self.transcriber_listen_host,
+                                                    self.transcriber_listen_port, reuse_address=True)
                 print(f"[*] Central service listening for transcriber on {self.transcriber_listen_host}:{self.transcriber_listen_port}")
-                break
+                return server
             except OSError as e:
                 if e.errno == 98: # Address already in use
                     print(f"[!] Port {self.transcriber_listen_port} is in use, retrying... ({i+1}/10)")
-                    time.sleep(1)
+                    await asyncio.sleep(1)
                 else:
                     print(f"[!!!] An unexpected error occurred while binding: {e}")
                     sys.exit(1)
-        else: # This else belongs to the for loop; it runs if the loop completes without a break
-            print(f"[!!!] Failed to bind to port {self.transcriber_listen_port} after multiple retries. Exiting.")
-            server_socket.close()
-            sys.exit(1)
+        print(f"[!!!] Failed to bind to port {self.transcriber_listen_port} after multiple retries. Exiting.")
+        sys.exit(1)
 
-        try:
-            while True:
-                conn, _ = server_socket.accept()
-                threading.Thread(target=self.handle_transcriber_client, args=(conn,), daemon=True).start()
-        except KeyboardInterrupt:
-            print("\n[*] Shutting down central service.")
-        finally:
-            server_socket.close()
+    async def export_traces(self):
+        """Periodically writes the latency reports and logs the headline numbers."""
+        while True:
+            await asyncio.sleep(self.trace_export_interval)
+            try:
+                await asyncio.to_thread(self.tracer.export)
+            except OSError as e:
+                print(f"[!] Could not write the latency reports: {e}")
+            print(f"[*] Latency: {self.tracer.describe()}")
+
+    async def run(self):
+        """
+        Runs the service: one writer task per peer plus the transcriber listener,
+        all in one task group so a failure or shutdown cancels them together.
+        An in-process transcriber replaces the listener.
+        """
+        # sock_read bounds the wait for each streamed line, not the whole answer.
+        timeout = aiohttp.ClientTimeout(sock_connect=10, sock_read=60)
+        async with aiohttp.ClientSession(timeout=timeout) as self.http:
+            try:
+                async with asyncio.TaskGroup() as services:
+                    for peer in (self.speaker, self.session, self.ui):
+                        services.create_task(peer.run())
+                    if self.tracer is not None:
+                        services.create_task(self.export_traces())
+                    if self.transcriber_link is not None:
+                        self.serve_local_transcriber(self.transcriber_link)
+                        await asyncio.get_running_loop().create_future() # Until cancelled
+                    server = await self.start_transcriber_server()
+                    async with server:
+                        await server.serve_forever()
+            finally:
+                tasks = list(self.llm_tasks.values()) + list(self.warmup_tasks.values())
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
 
 if __name__ == "__main__":
     config = load_config()
     orchestrator = CentralOrchestrator(config)
-    orchestrator.start()
-
+    try:
+        asyncio.run(orchestrator.run())
+    except KeyboardInterrupt:
+        print("\n[*] Shutting down central service.")
@@ -0,0 +1,96 @@
+"""
+Rolling conversation memory for central.py, configured under 'conversation'
+in config.yaml.
+
+Ollama returns a `context` list of token ids with every answer. Passing it
+back with the next prompt lets Ollama continue from its KV cache, so a
+follow-up question only prefills its own tokens. The token ids are also
+how the history is measured: once they pass max_context_tokens, the older
+turns are replaced by a summary. The next prompt then replays the summary
+and the most recent turns as text once, and the context starts over from
+that much smaller prefix.
+"""
+import re
+import time
+
+# Rough characters per token, for when Ollama returns no context.
+CHARS_PER_TOKEN = 4
+# Words that point back at earlier turns ("why is it?", "what about Paris?", "and
+# tomorrow?"). A question without any can be answered without the history.
+FOLLOW_UP_WORDS = {
+    "it", "its", "this", "that", "these", "those", "he", "him", "his", "she", "her", "hers",
+    "they", "them", "their", "theirs", "there", "then", "one", "ones", "again", "more", "else",
+    "also", "too", "another", "other", "same", "about", "and", "but", "so", "why", "previous", "last",
+}
+
+def is_self_contained(question):
+    """Whether the question makes sense without the conversation before it."""
+    return not FOLLOW_UP_WORDS.intersection(re.findall(r"[a-z]+", question.lower()))
+
+class Conversation:
+    """History of one mic's conversation with the LLM."""
+    def __init__(self, conversation_config):
+        self.max_context_tokens = conversation_config['max_context_tokens']
+        self.keep_recent_turns = conversation_config['keep_recent_turns']
+        self.turns = []
+        self.summary = ""
+        self.context = None
+        self.last_activity = time.time()
+
+    def is_empty(self):
+        return not self.turns and not self.summary
+
+    def history_prompt(self):
+        """
+        The history that has to be replayed as text before the next question,
+        or "" when Ollama's context already holds it.
+        """
+        if self.context is not None or self.is_empty():
+            return ""
+        # The context was dropped after summarizing; replay the history as text once.
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of the conversation so far: {self.summary}")
+        parts += [f"User: {question}\nAssistant: {answer}" for question, answer in self.turns]
+        return "\n\n".join(parts)
+
+    def build_prompt(self, command_text):
+        """Returns (prompt, context) for the next request to Ollama."""
+        self.last_activity = time.time()
+        history = self.history_prompt()
+        if not history:
+            return command_text, self.context
+        return f"{history}\n\nUser: {command_text}", None
+
+    def record(self, question, answer, context):
+        """Stores a finished exchange and the context Ollama returned for it."""
+        self.turns.append((question, answer))
+        self.context = context
+        self.last_activity = time.time()
+
+    def token_count(self):
+        if self.context is not None:
+            return len(self.context)
+        text = self.summary + "".join(question + answer for question, answer in self.turns)
+        return len(text) // CHARS_PER_TOKEN
+
+    def needs_summary(self):
+        return self.token_count() > self.max_context_tokens and len(self.turns) > self.keep_recent_turns
+
+    def turns_to_summarize(self):
+        return self.turns[:len(self.turns) - self.keep_recent_turns]
+
+    def apply_summary(self, summary, turn_count):
+        """Replaces the oldest turn_count turns with the summary and drops the context."""
+        self.summary = summary
+        del self.turns[:turn_count]
+        self.context = None
+
+def summary_prompt(conversation, turns):
+    """Builds the request that asks the LLM to condense older turns."""
+    lines = ["Summarize the following conversation in a few sentences. Keep names, facts, "
+             "preferences and anything left unanswered. Reply with the summary only."]
+    if conversation.summary:
+        lines.append(f"Earlier summary: {conversation.summary}")
+    lines += [f"User: {question}\nAssistant: {answer}" for question, answer in turns]
+    return "\n\n".join(lines)
@@ -0,0 +1,129 @@
+"""
+Length-prefixed message framing shared by all B.R.I.A.N. services.
+
+Every message on the wire is a 4-byte big-endian length followed by the
+payload. Frames are received straight into a reusable buffer with
+recv_into, so reading a large audio frame costs one copy instead of the
+quadratic re-copying of a `data += packet` loop. The *_async helpers speak the
+same format over asyncio streams.
+"""
+import asyncio
+import struct
+
+HEADER = struct.Struct('>I')
+# Largest frame any service accepts (about 17 minutes of 16 kHz int16 audio).
+MAX_FRAME_SIZE = 32 * 1024 * 1024
+
+class FrameTooLarge(ValueError):
+    """Raised when a frame exceeds the maximum allowed size."""
+
+class FrameReader:
+    """
+    Reads frames from a socket into a preallocated buffer. The buffer grows
+    to fit the largest frame seen so far, up to max_frame_size.
+    """
+    def __init__(self, sock, max_frame_size=MAX_FRAME_SIZE, initial_size=64 * 1024):
+        self.sock = sock
+        self.max_frame_size = max_frame_size
+        self._header = bytearray(HEADER.size)
+        self._buffer = bytearray(min(initial_size, max_frame_size))
+
+    def _recv_exactly(self, view):
+        """Fills the whole view. Returns False if the peer closes first."""
+        received = 0
+        while received < len(view):
+            count = self.sock.recv_into(view[received:])
+            if count == 0:
+                return False
+            received += count
+        return True
+
+    def read_frame(self):
+        """
+        Returns the next payload as a memoryview, or None if the peer closed the
+        connection cleanly. The view is only valid until the next call, so copy
+        it if it needs to outlive that.
+        """
+        header = memoryview(self._header)
+        count = self.sock.recv_into(header)
+        if count == 0:
+            return None
+        if count < HEADER.size and not self._recv_exactly(header[count:]):
+            raise ConnectionResetError("Connection closed in the middle of a frame header.")
+
+        length = HEADER.unpack(self._header)[0]
+        if length > self.max_frame_size:
+            raise FrameTooLarge(f"Frame of {length} bytes exceeds the {self.max_frame_size} byte limit.")
+        if length > len(self._buffer):
+            # Replace rather than resize: a caller may still hold a view of the old buffer.
+            self._buffer = bytearray(min(max(length, 2 * len(self._buffer)), self.max_frame_size))
+
+        payload = memoryview(self._buffer)[:length]
+        if not self._recv_exactly(payload):
+            raise ConnectionResetError("Connection closed in the middle of a frame.")
+        return payload
+
+    def read_text(self):
+        """Reads the next frame as UTF-8 text, or None if the peer closed."""
+        payload = self.read_frame()
+        if payload is None:
+            return None
+        return str(payload, 'utf-8')
+
+def send_frame(sock, payload, max_frame_size=MAX_FRAME_SIZE):
+    """Sends the length prefix and payload together with a scatter/gather send."""
+    payload = memoryview(payload)
+    if payload.nbytes > max_frame_size:
+        raise FrameTooLarge(f"Frame of {payload.nbytes} bytes exceeds the {max_frame_size} byte limit.")
+    payload = payload.cast('B')
+    header = HEADER.pack(len(payload))
+
+    if not hasattr(sock, 'sendmsg'): # Windows has no sendmsg
+        sock.sendall(header)
+        sock.sendall(payload)
+        return
+
+    sent = sock.sendmsg([header, payload])
+    # sendmsg may stop early on a full socket buffer; finish with sendall.
+    if sent < len(header):
+        sock.sendall(header[sent:])
+        sock.sendall(payload)
+    elif sent < len(header) + len(payload):
+        sock.sendall(payload[sent - len(header):])
+
+def send_text(sock, text):
+    """Encodes text as UTF-8 and sends it as one frame."""
+    send_frame(sock, text.encode('utf-8'))
+
+def encode_frame(payload, max_frame_size=MAX_FRAME_SIZE):
+    """Returns the length prefix and payload as one bytes object."""
+    if len(payload) > max_frame_size:
+        raise FrameTooLarge(f"Frame of {len(payload)} bytes exceeds the {max_frame_size} byte limit.")
+    return HEADER.pack(len(payload)) + payload
+
+async def read_frame_async(reader, max_frame_size=MAX_FRAME_SIZE):
+    """
+    Reads the next payload from an asyncio StreamReader, or returns None if the
+    peer closed the connection cleanly.
+    """
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise ConnectionResetError("Connection closed in the middle of a frame header.")
+
+    length = HEADER.unpack(header)[0]
+    if length > max_frame_size:
+        raise FrameTooLarge(f"Frame of {length} bytes exceeds the {max_frame_size} byte limit.")
+    try:
+        return await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise ConnectionResetError("Connection closed in the middle of a frame.")
+
+async def read_text_async(reader):
+    """Reads the next frame from a StreamReader as UTF-8 text, or None if the peer closed."""
+    payload = await read_frame_async(reader)
+    if payload is None:
+        return None
+    return payload.decode('utf-8')
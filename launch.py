@@ -1,10 +1,15 @@
 import subprocess
+import sys
 
 python_path = "/home/nischay/linenv311/bin/python"
-files_list = [
-    "central.py", "mic.py", "transcribe.py",
-    "session_mgr.py", "speaker.py", "ui_client.py"
-]
+if "--monolith" in sys.argv:
+    # Every service in one process, linked in memory (see monolith.py).
+    files_list = ["monolith.py"]
+else:
+    files_list = [
+        "central.py", "mic.py", "transcribe.py",
+        "session_mgr.py", "speaker.py", "ui_client.py"
+    ]
 
 for script in files_list:
     subprocess.Popen([
@@ -1,12 +1,18 @@
 #!/home/nischay/linenv311/bin/python
 import socket
+import threading
 import time
 import pyaudio
 import numpy as np
-import struct
 import collections
 import yaml
 import sys
+import json
+from framing import FrameReader, FrameTooLarge, send_frame
+from vad import VoiceActivityDetector
+from audio_codecs import Pcm16Codec, choose_codec, load_codec
+from transport import SocketEndpoint
+from tracing import add_span, new_trace
 
 def load_config():
     """Loads the main configuration file."""
@@ -18,66 +24,303 @@ def load_config():
         sys.exit(1)
 
 def main():
-    """Main loop to record, connect, and send audio."""
+    """Connects to the transcriber and the speaker over TCP and runs the mic."""
     config = load_config()
-
-    # --- Load Configuration ---
     try:
         mic_config = config['ports']['mic']
         transcriber_host = mic_config['transcriber_host']
         transcriber_port = mic_config['transcriber_port']
         speaker_status_host = mic_config['speaker_status_host']
         speaker_status_port = mic_config['speaker_status_port']
+        client_id = config['mic']['client_id']
+        codec_name = config['mic']['codec']
+        opus_bitrate = config['mic']['opus_bitrate']
+        tracing_enabled = config['tracing']['enabled']
+        streaming_enabled = config['streaming']['enabled']
+    except KeyError as e:
+        print(f"[!!!] CRITICAL: Missing configuration in config.yaml for mic service. Key not found: {e}")
+        sys.exit(1)
+
+    transcriber = TranscriberLink(transcriber_host, transcriber_port, client_id, codec_name, opus_bitrate,
+                                  tracing_enabled, streaming_enabled)
+    speaker_status = SpeakerStatusMonitor(speaker_status_host, speaker_status_port, client_id)
+    run_mic(config, transcriber, speaker_status)
+
+def run_mic(config, transcriber, speaker_status, stream=None):
+    """
+    Main loop to record and send audio. `stream` replaces the sound card's
+    input stream; anything with PyAudio's read(frames) method will do.
+    """
+    # --- Load Configuration ---
+    try:
+        streaming_config = config['streaming']
+        streaming_enabled = streaming_config['enabled']
+        chunk_seconds = streaming_config['chunk_seconds']
+        vad_config = config['vad']
+        barge_in_config = config['barge_in']
+        barge_in_enabled = barge_in_config['enabled']
+        tracing_enabled = config['tracing']['enabled']
     except KeyError as e:
         print(f"[!!!] CRITICAL: Missing configuration in config.yaml for mic service. Key not found: {e}")
         sys.exit(1)
 
     # --- Audio Configuration ---
-    CHUNK = 1024
     FORMAT = pyaudio.paInt16
     CHANNELS = 1
     RATE = 16000
-    SILENCE_SECONDS = 2
-    SILENCE_CHUNKS = int(RATE / CHUNK * SILENCE_SECONDS)
-    CALIBRATION_SECONDS = 5
+    try:
+        vad = VoiceActivityDetector(vad_config, RATE)
+        # Barge-in always uses the energy engine: its threshold is relative to a
+        # noise floor that can be re-learned from the speaker's echo.
+        barge_vad = VoiceActivityDetector(dict(vad_config, engine="energy",
+                                               threshold_db=barge_in_config['threshold_db'],
+                                               onset_frames=max(1, barge_in_config['onset_ms'] // vad_config['frame_ms'])), RATE)
+        echo_calibration_frames = max(1, barge_in_config['echo_calibration_ms'] // vad_config['frame_ms'])
+    except KeyError as e:
+        print(f"[!!!] CRITICAL: Missing VAD configuration in config.yaml. Key not found: {e}")
+        sys.exit(1)
+    CHUNK = vad.frame_samples
     PRE_SPEECH_PADDING_CHUNKS = int(RATE / CHUNK * 0.5)
+    CHUNKS_PER_SEND = max(1, int(RATE / CHUNK * chunk_seconds))
 
-    p = pyaudio.PyAudio()
-    stream = p.open(format=FORMAT, channels=CHANNELS, rate=RATE, input=True, frames_per_buffer=CHUNK)
+    p = None
+    if stream is None:
+        p = pyaudio.PyAudio()
+        stream = p.open(format=FORMAT, channels=CHANNELS, rate=RATE, input=True, frames_per_buffer=CHUNK)
     
-    silence_threshold = calibrate_microphone(stream, CALIBRATION_SECONDS, CHUNK, RATE)
+    calibrate_microphone(stream, vad, CHUNK, RATE)
     
-    sock = connect_to_transcriber(transcriber_host, transcriber_port)
-    status_sock = connect_to_speaker_status(speaker_status_host, speaker_status_port)
+    transcriber.connect()
+    speaker_status.start()
 
     try:
         while True:
-            status_sock = check_speaker_status(status_sock, speaker_status_host, speaker_status_port)
-            audio_data = record_until_silence(stream, silence_threshold, CHUNK, RATE, PRE_SPEECH_PADDING_CHUNKS, SILENCE_CHUNKS)
-            sock = send_audio_data(sock, audio_data, transcriber_host, transcriber_port)
+            lead = None
+            if barge_in_enabled:
+                if not speaker_status.idle.is_set():
+                    lead = listen_for_barge_in(stream, barge_vad, speaker_status, CHUNK,
+                                               PRE_SPEECH_PADDING_CHUNKS, echo_calibration_frames)
+            else:
+                speaker_status.wait_until_idle()
+            # Filled in with a trace id once speech is detected.
+            trace = {} if tracing_enabled else None
+            try:
+                if streaming_enabled:
+                    stream_until_silence(stream, transcriber, vad, CHUNK, PRE_SPEECH_PADDING_CHUNKS, CHUNKS_PER_SEND,
+                                         lead, trace, speaker_status)
+                else:
+                    audio_data = record_until_silence(stream, vad, CHUNK, PRE_SPEECH_PADDING_CHUNKS, lead, trace,
+                                                      speaker_status)
+                    transcriber.send_utterance(audio_data, trace)
+            except SpeakerBusy:
+                # The next pass listens for barge-in (or waits, with barge-in off).
+                print("[!] Speaker started talking. Discarded the recording.")
     except KeyboardInterrupt:
         print("\n[!] Exiting by user request.")
     finally:
         print("[*] Cleaning up resources.")
-        stream.stop_stream()
-        stream.close()
-        p.terminate()
-        sock.close()
-        if status_sock:
-            status_sock.close()
-
-def connect_to_transcriber(host, port):
-    """Attempts to connect to the transcription server with retries."""
-    while True:
+        if p is not None:
+            stream.stop_stream()
+            stream.close()
+            p.terminate()
+        transcriber.close()
+
+class TranscriberLink:
+    """
+    The connection to the transcriber. The hello offers the configured codec
+    (with pcm16 as the fallback) and the transcriber picks one; audio is then
+    encoded with it. A lost connection is re-established, with a fresh codec,
+    on the next send.
+
+    With tracing, the hello asks for it too. If the transcriber agrees, every
+    utterance is followed by one JSON frame with its trace (see tracing.py).
+    The hello also says whether this mic streams, so the transcriber reads
+    its frames that way whatever its own configuration.
+    """
+    def __init__(self, host, port, client_id, codec_name, opus_bitrate, tracing=False, streaming=False):
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        if choose_codec([codec_name]) != codec_name:
+            print(f"[!] Audio codec '{codec_name}' is unknown or not installed. Sending raw pcm16 instead.")
+            codec_name = "pcm16"
+        self.offered_codecs = [codec_name] if codec_name == "pcm16" else [codec_name, "pcm16"]
+        self.opus_bitrate = opus_bitrate
+        self.tracing = tracing
+        self.streaming = streaming
+        self.traced = False # Whether the transcriber agreed to tracing
+        self.sock = None
+        self.codec = None
+
+    def connect(self):
+        """Attempts to connect to the transcription server with retries and introduces this mic."""
+        while True:
+            try:
+                print(f"[*] Mic attempting to connect to transcriber at {self.host}:{self.port}...")
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.connect((self.host, self.port))
+                hello = {"client_id": self.client_id, "codecs": self.offered_codecs, "trace": self.tracing,
+                         "streaming": self.streaming}
+                send_frame(sock, json.dumps(hello).encode('utf-8'))
+                reply = FrameReader(sock).read_text()
+                if reply is None:
+                    raise ConnectionResetError("Transcriber closed the connection during the hello.")
+                reply = json.loads(reply)
+                self.codec = load_codec(reply["codec"], self.opus_bitrate)
+                self.traced = self.tracing and reply.get("trace", False)
+                self.sock = sock
+                print(f"[+] Mic '{self.client_id}' connected to transcriber ({self.codec.name} audio).")
+                return
+            except Exception as e:
+                print(f"[!] Connection to transcriber failed: {e}. Retrying in 5s...")
+                time.sleep(5)
+
+    def send_payload(self, payload):
+        """Sends one frame. Returns False if the transcriber was gone and had to be reconnected."""
         try:
-            print(f"[*] Mic attempting to connect to transcriber at {host}:{port}...")
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.connect((host, port))
-            print("[+] Mic connected to transcriber.")
-            return sock
-        except Exception as e:
-            print(f"[!] Connection to transcriber failed: {e}. Retrying in 5s...")
-            time.sleep(5)
+            send_frame(self.sock, payload)
+            return True
+        except (socket.error, BrokenPipeError):
+            print("[!] Transcriber disconnected. Reconnecting...")
+            self.sock.close()
+            self.connect()
+            return False
+
+    def send_audio(self, pcm):
+        """Encodes and sends a piece of an utterance. Returns the bytes put on the wire."""
+        payload = self.codec.encode(pcm)
+        # An empty frame would end the utterance; the encoder may still be holding the audio.
+        if payload and self.send_payload(payload):
+            return len(payload)
+        return 0
+
+    def end_utterance(self, trace=None):
+        """Sends whatever the encoder still holds, then the empty end-of-utterance frame."""
+        sent = 0
+        tail = self.codec.flush()
+        if tail and self.send_payload(tail):
+            sent = len(tail)
+        if self.send_payload(b''):
+            self.send_trace(trace)
+        return sent
+
+    def send_utterance(self, pcm, trace=None):
+        """Sends a complete utterance as a single frame (non-streaming mode)."""
+        payload = self.codec.encode(pcm) + self.codec.flush()
+        if self.send_payload(payload):
+            self.send_trace(trace)
+            print(f"[*] Sent {len(pcm)} bytes of audio as {len(payload)} bytes of {self.codec.name}.")
+
+    def send_trace(self, trace):
+        """Follows a finished utterance with its trace, if tracing was agreed on."""
+        if self.traced:
+            self.send_payload(json.dumps(dict(trace or {}, sent=time.time())).encode('utf-8'))
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+
+class LocalTranscriberLink:
+    """
+    TranscriberLink for a transcriber hosted in the same process (monolith
+    mode). Audio is converted to float32 once, here, and the array itself is
+    handed to the transcriber; nothing is encoded or copied through a socket.
+    """
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.codec = Pcm16Codec()
+
+    def connect(self):
+        print("[+] Mic linked to the transcriber in-process.")
+
+    def send_audio(self, pcm):
+        self.endpoint.send((self.codec.decode(pcm), None))
+        return len(pcm)
+
+    def end_utterance(self, trace=None):
+        self.endpoint.send((self.codec.decode(b''), trace))
+        return 0
+
+    def send_utterance(self, pcm, trace=None):
+        self.endpoint.send((self.codec.decode(pcm), trace))
+
+    def close(self):
+        self.endpoint.close()
+
+class SpeakerStatusMonitor:
+    """
+    Keeps a subscription open to the speaker's status server, which pushes
+    every BUSY/IDLE transition as it happens. Recording waits on the IDLE
+    event instead of polling. The speaker also sends PLAYING once its audio
+    actually starts, which sets the playing event. The same connection carries
+    STOP requests back to the speaker when the user barges in, tagged with
+    this mic's client id so central knows whose answer was interrupted.
+    """
+    def __init__(self, host, port, client_id):
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.idle = threading.Event()
+        self.playing = threading.Event()
+        self.endpoint = None
+        self.endpoint_lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        while True:
+            endpoint = self.connect()
+            with self.endpoint_lock:
+                self.endpoint = endpoint
+            try:
+                for status in endpoint:
+                    if status == "PLAYING":
+                        self.playing.set()
+                        continue
+                    self.playing.clear()
+                    if status == "IDLE":
+                        self.idle.set()
+                    else:
+                        self.idle.clear()
+            except (socket.error, FrameTooLarge) as e:
+                print(f"[!] Speaker status connection error: {e}")
+            with self.endpoint_lock:
+                self.endpoint = None
+            endpoint.close()
+            # Until we hear from the speaker again we can't know it is quiet.
+            self.idle.clear()
+            self.playing.clear()
+            print("[!] Speaker status connection lost. Reconnecting...")
+            time.sleep(1)
+
+    def wait_until_idle(self):
+        """Blocks until the speaker reports IDLE."""
+        if not self.idle.is_set():
+            print("[*] Speaker is busy, waiting...")
+            self.idle.wait()
+
+    def connect(self):
+        return SocketEndpoint(connect_to_speaker_status(self.host, self.port))
+
+    def request_stop(self):
+        """Asks the speaker to stop talking. It stops playback and tells central to cancel the answer."""
+        with self.endpoint_lock:
+            if self.endpoint is None:
+                return
+            try:
+                self.endpoint.send(f"STOP:{self.client_id}")
+            except socket.error as e:
+                print(f"[!] Could not send STOP to the speaker: {e}")
+
+class LocalSpeakerStatusMonitor(SpeakerStatusMonitor):
+    """Subscribes to a speaker hosted in the same process (monolith mode)."""
+    def __init__(self, endpoint, client_id):
+        super().__init__(None, None, client_id)
+        self.local_endpoint = endpoint
+
+    def connect(self):
+        return self.local_endpoint
 
 def connect_to_speaker_status(host, port):
     """Connects to the speaker status server."""
@@ -90,80 +333,160 @@ def connect_to_speaker_status(host, port):
             print(f"[!] Could not connect to speaker status server: {e}. Retrying...")
             time.sleep(3)
 
-def check_speaker_status(sock, host, port):
-    """Checks if the speaker is busy. Reconnects if necessary."""
-    while True:
-        try:
-            # Reconnect for each check to get the most current status
-            if sock:
-                sock.close()
-            sock = connect_to_speaker_status(host, port)
-            status = sock.recv(1024).decode('utf-8')
-            if status == "BUSY":
-                print("[*] Speaker is busy, waiting...")
-                time.sleep(0.5)
-                continue # Re-check status in the next loop iteration
-            else:
-                return sock # Return the valid socket
-        except (socket.error, BrokenPipeError):
-            print("[!] Speaker status connection lost. Reconnecting...")
-            time.sleep(1)
-
-
-def calibrate_microphone(stream, seconds, chunk, rate):
-    """Listens for a few seconds to determine the ambient noise level."""
+def calibrate_microphone(stream, vad, chunk, rate):
+    """Listens for a few seconds so the VAD can learn the ambient noise level."""
+    seconds = vad.calibration_seconds
     print(f"[*] Calibrating for {seconds} seconds. Please be quiet...")
     
     for _ in range(5): # Warm-up read
         stream.read(chunk, exception_on_overflow=False)
         
-    noise_levels = [np.abs(np.frombuffer(stream.read(chunk, exception_on_overflow=False), dtype=np.int16)).mean() for _ in range(int(rate / chunk * seconds))]
-    
-    median_noise = np.median(noise_levels)
-    dynamic_threshold = median_noise * 2.0 + 300
-    final_threshold = max(dynamic_threshold, 400)
+    frames = [stream.read(chunk, exception_on_overflow=False) for _ in range(int(rate / chunk * seconds))]
+    vad.calibrate(frames)
 
-    print(f"[+] Calibration complete. Median noise: {median_noise:.2f}, Threshold: {final_threshold:.2f}")
-    return final_threshold
+    median_noise = np.median([np.abs(np.frombuffer(frame, dtype=np.int16)).mean() for frame in frames])
+    print(f"[+] Calibration complete. Median noise: {median_noise:.2f}, VAD engine: {vad.engine_name}")
 
-def record_until_silence(stream, silence_threshold, chunk, rate, padding, silence_chunks):
-    """Waits for speech to start, records it, and stops when silence is detected."""
+class SpeakerBusy(Exception):
+    """Raised when the speaker starts talking while the mic is waiting for or recording speech."""
+
+def check_speaker_idle(speaker_status):
+    """Raises SpeakerBusy unless the speaker is idle, so its voice is never recorded as the user's."""
+    if speaker_status is not None and not speaker_status.idle.is_set():
+        raise SpeakerBusy()
+
+def wait_for_speech(stream, vad, chunk, padding, speaker_status=None):
+    """
+    Blocks until speech starts and returns the padded frames leading up to it.
+    Raises SpeakerBusy if the speaker starts talking first.
+    """
     print("[*] Waiting for speech...")
     pre_buffer = collections.deque(maxlen=padding)
+    vad.reset()
     
     while True:
         data = stream.read(chunk, exception_on_overflow=False)
+        check_speaker_idle(speaker_status)
         pre_buffer.append(data)
-        if np.abs(np.frombuffer(data, dtype=np.int16)).mean() > silence_threshold:
+        if vad.update(data):
             print("[+] Speech detected. Recording...")
-            break
-            
-    frames = list(pre_buffer)
-    silence_counter = 0
+            return list(pre_buffer)
+
+def listen_for_barge_in(stream, vad, speaker_status, chunk, padding, calibration_frames):
+    """
+    Listens while the speaker is talking. The first calibration_frames of
+    playback teach the VAD what the assistant's own voice sounds like through
+    the mic, so only speech well above that echo interrupts it. Frames read
+    before the speaker reports PLAYING (while it is still synthesizing) hold
+    no echo and are skipped. Returns the padded frames leading up to the
+    user's speech after asking the speaker to stop, or None once the speaker
+    has finished on its own.
+    """
+    print("[*] Speaker is busy, listening for barge-in...")
+    echo = []
+    pre_buffer = collections.deque(maxlen=padding)
+    vad.reset()
+    while not speaker_status.idle.is_set():
+        data = stream.read(chunk, exception_on_overflow=False)
+        if not speaker_status.playing.is_set():
+            continue
+        if len(echo) < calibration_frames:
+            echo.append(data)
+            if len(echo) == calibration_frames:
+                vad.calibrate(echo)
+            continue
+        pre_buffer.append(data)
+        if vad.update(data):
+            print("[+] Barge-in detected. Stopping the speaker...")
+            speaker_status.request_stop()
+            return list(pre_buffer)
+    return None
+
+def speech_frames(stream, vad, chunk, padding, lead=None, trace=None, speaker_status=None):
+    """
+    Yields the frames of one utterance: the padding before speech, the speech
+    itself, and only trailing_padding_ms of the silence that ended it. Pauses
+    are held back and only yielded if speech resumes, so Whisper never has to
+    decode the end-of-speech timeout. `lead` holds frames of speech that has
+    already started (a barge-in); recording then continues from them.
+
+    Given a speaker_status, raises SpeakerBusy as soon as the speaker starts
+    talking, so half-duplex mics never record its voice. A barge-in has just
+    stopped the speaker and is not checked.
+
+    A trace dict, if given, gets a new trace id when speech is detected and
+    the endpointing span once the utterance ends.
+    """
+    if lead is None:
+        lead = wait_for_speech(stream, vad, chunk, padding, speaker_status)
+    else:
+        speaker_status = None
+        vad.reset(active=True)
+    if trace is not None:
+        trace.update(new_trace())
+    yield from lead
+    held = []
+    recorded = 0
+    silence_started = None
     while True:
         data = stream.read(chunk, exception_on_overflow=False)
-        frames.append(data)
-        if np.abs(np.frombuffer(data, dtype=np.int16)).mean() < silence_threshold:
-            silence_counter += 1
+        check_speaker_idle(speaker_status)
+        recorded += 1
+        if vad.update(data):
+            yield from held
+            held = []
+            yield data
         else:
-            silence_counter = 0
-        if silence_counter > silence_chunks:
-            print("[*] Silence detected. Stopped recording.")
+            if not held:
+                silence_started = time.time()
+            held.append(data)
+            if len(held) >= vad.end_of_speech_frames:
+                print("[*] Silence detected. Stopped recording.")
+                break
+        if recorded >= vad.max_utterance_frames:
+            print("[!] Maximum utterance length reached. Stopped recording.")
             break
-    return b''.join(frames)
+    if trace is not None:
+        add_span(trace, "endpointing", silence_started if held else time.time())
+    yield from held[:vad.trailing_frames]
 
-def send_audio_data(sock, audio_data, host, port):
-    """Sends the raw audio data to the server with a length prefix."""
+def record_until_silence(stream, vad, chunk, padding, lead=None, trace=None, speaker_status=None):
+    """Waits for speech to start, records it, and stops when silence is detected."""
+    return b''.join(speech_frames(stream, vad, chunk, padding, lead, trace, speaker_status))
+
+def stream_until_silence(stream, transcriber, vad, chunk, padding, chunks_per_send, lead=None, trace=None,
+                         speaker_status=None):
+    """
+    Streams speech to the transcriber while it is being recorded. Audio is sent
+    in small frames as soon as they fill up, and an empty frame marks the end
+    of the utterance once silence is detected.
+
+    If the speaker starts talking mid-utterance, the unsent frames are dropped
+    and SpeakerBusy is re-raised. What was already sent was recorded before
+    the speaker started, so that part is ended as a normal utterance.
+    """
+    pending = []
+    audio_bytes = sent_bytes = 0
     try:
-        length = struct.pack('>I', len(audio_data))
-        sock.sendall(length)
-        sock.sendall(audio_data)
-        print(f"[*] Sent {len(audio_data)} bytes of audio data.")
-        return sock
-    except (socket.error, BrokenPipeError):
-        print("[!] Transcriber disconnected. Reconnecting...")
-        sock.close()
-        return connect_to_transcriber(host, port)
+        for data in speech_frames(stream, vad, chunk, padding, lead, trace, speaker_status):
+            pending.append(data)
+            if len(pending) >= chunks_per_send:
+                audio_data = b''.join(pending)
+                sent_bytes += transcriber.send_audio(audio_data)
+                audio_bytes += len(audio_data)
+                pending = []
+    except SpeakerBusy:
+        if audio_bytes:
+            transcriber.end_utterance(trace)
+        raise
+
+    if pending:
+        audio_data = b''.join(pending)
+        sent_bytes += transcriber.send_audio(audio_data)
+        audio_bytes += len(audio_data)
+    # An empty frame tells the transcriber the utterance is complete.
+    sent_bytes += transcriber.end_utterance(trace)
+    print(f"[*] Streamed {audio_bytes} bytes of audio as {sent_bytes} bytes of {transcriber.codec.name}.")
 
 if __name__ == "__main__":
     main()
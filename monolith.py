@@ -0,0 +1,108 @@
+#!/home/nischay/linenv311/bin/python
+"""
+Runs B.R.I.A.N. as a single process: central, the transcriber, the session
+manager and the speaker, plus the microphone and the UI when enabled under
+'monolith' in config.yaml. The services are joined by in-memory links
+(transport.py) instead of loopback TCP, and start with one interpreter and
+one set of imports instead of six.
+
+Services left out still work over TCP: remote mics connect to the
+transcriber's usual port, and central connects to a separately started UI.
+"""
+import asyncio
+import os
+import threading
+import sys
+import yaml
+import central
+import mic
+import session_mgr
+import speaker
+import transcribe
+from transport import local_link
+
+def load_config():
+    """Loads the main configuration file."""
+    try:
+        with open("config.yaml", "r") as f:
+            return yaml.safe_load(f)
+    except FileNotFoundError:
+        print("[!!!] CRITICAL: config.yaml not found.")
+        sys.exit(1)
+
+def start_thread(target, *args, name=None):
+    threading.Thread(target=target, args=args, name=name, daemon=True).start()
+
+def load_models(pipeline, config):
+    """
+    Loads the transcriber's models while the other services run. load_models
+    exits on failure, but sys.exit would only end this thread, so the whole
+    process is taken down instead.
+    """
+    try:
+        pipeline.set_models(*transcribe.load_models(config))
+    except SystemExit as e:
+        sys.stdout.flush()
+        os._exit(e.code if isinstance(e.code, int) else 1)
+
+def main():
+    config = load_config()
+    try:
+        host_mic = config['monolith']['mic']
+        host_ui = config['monolith']['ui']
+        client_id = config['mic']['client_id']
+    except KeyError as e:
+        print(f"[!!!] CRITICAL: Missing configuration in config.yaml for monolith mode. Key not found: {e}")
+        sys.exit(1)
+
+    # --- Links: the central side of each is handed to CentralOrchestrator ---
+    links = {}
+    links["transcriber"], transcriber_central = local_link()
+    links["speaker"], speaker_central = local_link()
+    links["session"], session_central = local_link()
+
+    manager = session_mgr.start_session_manager(config)
+    start_thread(session_mgr.record_interactions, session_central, manager, name="session")
+
+    audio_queue, player = speaker.start_speaker(config)
+    start_thread(speaker.serve_central, speaker_central, name="speaker")
+
+    pipeline = transcribe.TranscriberPipeline(config, central=transcriber_central)
+    pipeline.start_workers()
+    start_thread(pipeline.serve_mics, name="mic-server")
+
+    if host_mic:
+        mic_audio, transcriber_mic = local_link()
+        mic_status, speaker_mic = local_link()
+        start_thread(pipeline.ingest_local_mic, client_id, transcriber_mic, name="mic-ingest")
+        speaker.add_status_subscriber(speaker_mic, "in-process mic", audio_queue, player)
+        start_thread(mic.run_mic, config, mic.LocalTranscriberLink(mic_audio),
+                     mic.LocalSpeakerStatusMonitor(mic_status, client_id), name="mic")
+
+    # Loaded in the background: central and the UI start while torch and the weights load.
+    start_thread(load_models, pipeline, config, name="model-loader")
+
+    try:
+        if not host_ui:
+            orchestrator = central.CentralOrchestrator(config, links)
+            asyncio.run(orchestrator.run())
+            return
+
+        # Tk has to own the main thread, so central's event loop gets another one.
+        import tkinter as tk
+        import ui_client
+        links["ui"], ui_central = local_link()
+        orchestrator = central.CentralOrchestrator(config, links)
+        start_thread(asyncio.run, orchestrator.run(), name="central")
+
+        root = tk.Tk()
+        app = ui_client.AssistantUI(root, config['ui'])
+        start_thread(ui_client.relay_messages, ui_central, app.message_queue, name="ui")
+        root.mainloop()
+    except KeyboardInterrupt:
+        print("\n[*] Shutting down.")
+    finally:
+        manager.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Cache of LLM answers for central.py, configured under 'response_cache' in
+config.yaml.
+
+Entries are keyed on the model name plus the normalized prompt (lower case,
+no punctuation, single spaces), expire after a TTL and are evicted least
+recently used first. The cache is saved to a JSON file so it survives
+restarts. When an embedding is given for a prompt, a miss on the exact key
+falls back to the most similar cached prompt of the same model, which lets
+paraphrased questions hit too.
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+def normalize_prompt(text):
+    """Lower-cases the prompt and strips punctuation and repeated whitespace."""
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+class ResponseCache:
+    """TTL + LRU cache of answers, persisted to a JSON file."""
+    def __init__(self, cache_config):
+        self.path = cache_config['file']
+        self.ttl = cache_config['ttl_hours'] * 3600
+        self.max_entries = cache_config['max_entries']
+        self.similarity_threshold = cache_config['similarity_threshold']
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.write_lock = threading.Lock()
+        self.load()
+
+    @staticmethod
+    def key(model, prompt):
+        return f"{model}\n{normalize_prompt(prompt)}"
+
+    def load(self):
+        """Reads the cache file, skipping entries that have expired."""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"[!] Ignoring unreadable response cache {self.path}: {e}")
+            return
+        now = time.time()
+        for key, entry in saved:
+            if now - entry['created'] < self.ttl:
+                self.entries[key] = entry
+        print(f"[*] Loaded {len(self.entries)} cached responses from {self.path}")
+
+    def snapshot(self):
+        """Serializes the cache. Call on the thread that owns the cache."""
+        return json.dumps(list(self.entries.items()))
+
+    def write(self, snapshot):
+        """Atomically replaces the cache file. Safe to call from a worker thread."""
+        with self.write_lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(snapshot)
+            os.replace(tmp_path, self.path)
+
+    def get(self, model, prompt, embedding=None):
+        """Returns the cached answer for the prompt, or None on a miss."""
+        key = self.key(model, prompt)
+        entry = self.entries.get(key)
+        if entry is not None and time.time() - entry['created'] >= self.ttl:
+            del self.entries[key]
+            entry = None
+        if entry is None and embedding is not None:
+            key = self.nearest(model, embedding)
+            entry = self.entries.get(key) if key is not None else None
+            if entry is not None:
+                self.semantic_hits += 1
+
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry['response']
+
+    def nearest(self, model, embedding):
+        """Returns the key of the most similar live prompt above the threshold, if any."""
+        now = time.time()
+        candidates = [
+            (key, entry['embedding']) for key, entry in self.entries.items()
+            if entry['model'] == model and entry.get('embedding') is not None and now - entry['created'] < self.ttl
+        ]
+        if not candidates:
+            return None
+        matrix = np.array([vector for _, vector in candidates], dtype=np.float32)
+        query = np.asarray(embedding, dtype=np.float32)
+        similarity = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-9)
+        best = int(np.argmax(similarity))
+        return candidates[best][0] if similarity[best] >= self.similarity_threshold else None
+
+    def put(self, model, prompt, response, embedding=None):
+        key = self.key(model, prompt)
+        self.entries[key] = {
+            "model": model,
+            "prompt": prompt,
+            "response": response,
+            "created": time.time(),
+            "embedding": embedding,
+        }
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def describe(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        return (f"{self.hits} hits ({self.semantic_hits} by similarity), {self.misses} misses, "
+                f"hit rate {hit_rate:.0%}, {len(self.entries)} entries")
@@ -0,0 +1,46 @@
+"""
+Sentence splitting shared by central.py, which speaks streamed LLM answers
+sentence by sentence, and speaker.py, which synthesizes one sentence while
+the previous one plays.
+"""
+import re
+
+class SentenceSplitter:
+    """
+    Incrementally splits streamed text into complete sentences. Each sentence
+    is returned with its trailing whitespace so the original layout of the
+    text (line breaks, lists) can be reproduced by joining them back together.
+    """
+    # A sentence ends at '.', '!' or '?' followed by whitespace, or at a line break.
+    BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+    # A list number on its own ("1.") or text ending in an abbreviation ("e.g.") is not a
+    # sentence. A sentence may well end in a number ("I was born in 1990.").
+    NON_TERMINAL = re.compile(r"^\s*\d+\.$|(?:^|\s)(?:[A-Za-z]|e\.g|i\.e|etc|vs|Mr|Mrs|Ms|Dr|St)\.$")
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, text):
+        """Adds streamed text and returns the sentences it completed."""
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in self.BOUNDARY.finditer(self.buffer):
+            if match.end() == len(self.buffer):
+                break # More whitespace may still follow in the next chunk
+            if "\n" not in match.group() and self.NON_TERMINAL.search(self.buffer[start:match.start()]):
+                continue
+            sentences.append(self.buffer[start:match.end()])
+            start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        """Returns whatever text is left once the stream has ended."""
+        remainder, self.buffer = self.buffer, ""
+        return [remainder] if remainder.strip() else []
+
+def split_sentences(text):
+    """Splits a complete text into sentences, keeping their trailing whitespace."""
+    splitter = SentenceSplitter()
+    return splitter.feed(text) + splitter.flush()
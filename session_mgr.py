@@ -1,6 +1,5 @@
 #!/home/nischay/linenv311/bin/python
 import socket
-import struct
 import json
 import os
 import time
@@ -8,6 +7,8 @@ from datetime import datetime
 import threading
 import yaml
 import sys
+from framing import FrameTooLarge
+from transport import SocketEndpoint
 
 def load_config():
     """Loads the main configuration file."""
@@ -19,11 +20,21 @@ def load_config():
         sys.exit(1)
 
 class SessionManager:
+    """
+    Records interactions in an append-only JSON Lines journal next to the
+    session file. Each entry costs one small append no matter how long the
+    session is, and a crash can at most lose the last, partly written line.
+    When the session ends the journal is compacted into the usual
+    session_*.json file.
+    """
     def __init__(self, config):
         self.log_dir = config['paths']['session_log_directory']
         self.timeout = config['session']['timeout_minutes'] * 60
-        self.current_session = None
+        self.fsync_interval = config['session']['fsync_interval_seconds']
+        self.fsync_batch_size = config['session']['fsync_batch_size']
         self.session_file = None
+        self.journal = None
+        self.unsynced_entries = 0
         self.last_activity = None
         self.lock = threading.Lock()
         
@@ -31,87 +42,162 @@ class SessionManager:
             os.makedirs(self.log_dir)
             print(f"[*] Created session log directory at: {self.log_dir}")
 
+        self.recover_journals()
+
+    @staticmethod
+    def journal_path(session_file):
+        return os.path.splitext(session_file)[0] + ".jsonl"
+
+    def recover_journals(self):
+        """Compacts journals left behind by a crash into their session files."""
+        for name in sorted(os.listdir(self.log_dir)):
+            if name.startswith("session_") and name.endswith(".jsonl"):
+                journal = os.path.join(self.log_dir, name)
+                print(f"[*] Recovering unfinished session from {journal}")
+                compact_journal(journal, os.path.splitext(journal)[0] + ".json")
+
     def start_new_session(self):
         """Starts a new session, saving the previous one if it exists."""
         with self.lock:
-            if self.current_session is not None:
-                self.save_session()
-            
-            session_id = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            self.session_file = os.path.join(self.log_dir, f"session_{session_id}.json")
-            self.current_session = []
-            self.last_activity = time.time()
-            print(f"[*] Starting new session: {self.session_file}")
+            self._open_session()
+
+    def _open_session(self):
+        """Closes any open session and opens a fresh journal. Caller holds the lock."""
+        if self.journal is not None:
+            self._close_session()
+
+        session_id = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        self.session_file = os.path.join(self.log_dir, f"session_{session_id}.json")
+        self.journal = open(self.journal_path(self.session_file), 'a', encoding='utf-8')
+        self.unsynced_entries = 0
+        self.last_activity = time.time()
+        print(f"[*] Starting new session: {self.session_file}")
 
     def add_entry(self, entry_data):
-        """Adds a new interaction to the current session."""
+        """Appends a new interaction to the current session's journal."""
+        line = json.dumps({
+            "timestamp": datetime.now().isoformat(),
+            "interaction": entry_data
+        }) + "\n"
         with self.lock:
-            if self.current_session is None:
-                self.start_new_session()
+            if self.journal is None:
+                self._open_session()
             
-            self.current_session.append({
-                "timestamp": datetime.now().isoformat(),
-                "interaction": entry_data
-            })
+            try:
+                self.journal.write(line)
+                self.journal.flush()
+                self.unsynced_entries += 1
+                if self.unsynced_entries >= self.fsync_batch_size:
+                    self._sync()
+            except OSError as e:
+                print(f"[!] Error writing session journal: {e}")
             self.last_activity = time.time()
-            self.save_session()
             print(f"[+] Added entry to session {os.path.basename(self.session_file)}.")
 
-    def save_session(self):
-        """Saves the current session data to its JSON file."""
-        if self.session_file and self.current_session is not None:
-            try:
-                with open(self.session_file, 'w') as f:
-                    json.dump(self.current_session, f, indent=4)
-            except Exception as e:
-                print(f"[!] Error saving session file: {e}")
+    def _sync(self):
+        """Forces journal writes to disk. Caller holds the lock."""
+        if self.journal is not None and self.unsynced_entries:
+            os.fsync(self.journal.fileno())
+            self.unsynced_entries = 0
+
+    def sync_journal(self):
+        """Background loop that batches fsyncs instead of syncing every entry."""
+        while True:
+            time.sleep(self.fsync_interval)
+            with self.lock:
+                try:
+                    self._sync()
+                except OSError as e:
+                    print(f"[!] Error syncing session journal: {e}")
+
+    def _close_session(self):
+        """Closes the journal and compacts it into the session file. Caller holds the lock."""
+        try:
+            self._sync()
+            self.journal.close()
+        except OSError as e:
+            print(f"[!] Error closing session journal: {e}")
+        compact_journal(self.journal_path(self.session_file), self.session_file)
+        self.journal = None
+        self.session_file = None
+
+    def close(self):
+        """Saves the current session, e.g. on shutdown."""
+        with self.lock:
+            if self.journal is not None:
+                self._close_session()
 
     def check_timeout(self):
         """Periodically checks if the session has timed out due to inactivity."""
         while True:
             time.sleep(60) # Check every minute
             with self.lock:
-                if self.current_session is not None and (time.time() - self.last_activity > self.timeout):
+                if self.journal is not None and (time.time() - self.last_activity > self.timeout):
                     print(f"[*] Session timed out. Saving and closing session file.")
-                    self.save_session()
-                    self.current_session = None
-                    self.session_file = None
+                    self._close_session()
+
+def read_journal(journal_file):
+    """Reads journal entries, skipping a line cut short by a crash."""
+    entries = []
+    with open(journal_file, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"[!] Skipping unreadable entry on line {line_number} of {journal_file}.")
+    return entries
+
+def compact_journal(journal_file, session_file):
+    """
+    Rewrites a journal in the session_*.json format and removes it. The new
+    file is written next to the old one and swapped in atomically.
+    """
+    try:
+        entries = read_journal(journal_file)
+        if entries:
+            temp_file = session_file + ".tmp"
+            with open(temp_file, 'w') as f:
+                json.dump(entries, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, session_file)
+        os.remove(journal_file)
+    except OSError as e:
+        print(f"[!] Error saving session file: {e}")
+
+def record_interactions(endpoint, manager):
+    """Adds every interaction central sends to the session until its link closes."""
+    for data in endpoint:
+        try:
+            interaction = json.loads(data)
+            manager.add_entry(interaction)
+        except json.JSONDecodeError as e:
+            print(f"[!] Received malformed JSON data: {e}")
 
 def handle_client(conn, manager):
     """Handles the incoming connection from the central service."""
     print("[+] Central service connected to session manager.")
     try:
         with conn:
-            while True:
-                # 1. Read the 4-byte length prefix
-                length_bytes = conn.recv(4)
-                if not length_bytes:
-                    break
-                length = struct.unpack('>I', length_bytes)[0]
-                
-                # 2. Loop to ensure the full message is received
-                data = b""
-                while len(data) < length:
-                    packet = conn.recv(length - len(data))
-                    if not packet:
-                        break
-                    data += packet
-                
-                if len(data) < length:
-                    break # Incomplete message received
-
-                # 3. Process the complete message
-                try:
-                    interaction = json.loads(data.decode('utf-8'))
-                    manager.add_entry(interaction)
-                except json.JSONDecodeError as e:
-                    print(f"[!] Received malformed JSON data: {e}")
-
+            record_interactions(SocketEndpoint(conn), manager)
     except (ConnectionResetError, BrokenPipeError):
         print("[-] Central service disconnected from session manager.")
+    except FrameTooLarge as e:
+        print(f"[!] Dropping central service connection: {e}")
     finally:
         print("[*] Session manager client handler finished.")
 
+def start_session_manager(config):
+    """Opens a new session and starts the timeout and fsync threads."""
+    manager = SessionManager(config)
+    manager.start_new_session()
+
+    threading.Thread(target=manager.check_timeout, daemon=True).start()
+    threading.Thread(target=manager.sync_journal, daemon=True).start()
+    return manager
+
 def main():
     config = load_config()
     try:
@@ -121,10 +207,7 @@ def main():
         print(f"[!!!] CRITICAL: Missing configuration in config.yaml for session_manager. Key not found: {e}")
         sys.exit(1)
 
-    manager = SessionManager(config)
-    manager.start_new_session()
-    
-    threading.Thread(target=manager.check_timeout, daemon=True).start()
+    manager = start_session_manager(config)
 
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -157,6 +240,7 @@ def main():
         print("\n[*] Shutting down session manager.")
     finally:
         server_socket.close()
+        manager.close()
 
 if __name__ == "__main__":
     main()
@@ -1,12 +1,15 @@
 import subprocess
 
 files_list = [
+    # First, so it doesn't restart the services stopped after it.
+    "supervisor.py",
     "central.py",
     "mic.py",
     "transcribe.py",
     "session_mgr.py",
     "speaker.py",
-    "ui_client.py"
+    "ui_client.py",
+    "monolith.py"
 ]
 
 for script in files_list:
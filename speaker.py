@@ -2,16 +2,40 @@
 import socket
 import threading
 import queue
-import struct
 import time
-import pyttsx3
+import pyaudio
+import numpy as np
 import yaml
 import sys
+import json
+from framing import FrameTooLarge
+from transport import SocketEndpoint
+from tts_backends import load_tts_backend
+from tts_cache import TTSCache
+from sentences import split_sentences
+from tracing import add_span
 
 # --- Global State ---
 speaker_status = "IDLE"
 status_lock = threading.Lock()
+# Whether the subscribers were told that this BUSY period's audio has started playing.
+playback_announced = False
+# Endpoints of the status subscribers (mics).
+status_subscribers = []
 text_queue = queue.Queue()
+# Texts received but not yet fully played; the speaker is BUSY while this is above zero.
+pending_texts = 0
+pending_lock = threading.Lock()
+# Bumped by a barge-in; text and audio from an older generation are dropped.
+generation = 0
+# Barge-ins central has not acknowledged with a fence yet. Text arriving
+# meanwhile was sent before central cancelled the answer, so it is dropped.
+fences_pending = 0
+# Marks the end of one received text in the audio queue.
+END_OF_TEXT = None
+# The central service's endpoint, used to tell it about barge-ins and traced spans.
+central_conn = None
+central_lock = threading.Lock()
 
 def load_config():
     """Loads the main configuration file."""
@@ -25,88 +49,343 @@ def load_config():
         print(f"[!!!] CRITICAL: Error parsing config.yaml: {e}")
         sys.exit(1)
 
-def tts_worker(config):
+def push_to_subscribers(message):
+    """Sends a status message to every subscriber. The caller holds status_lock."""
+    for subscriber in list(status_subscribers):
+        try:
+            subscriber.send(message)
+        except OSError:
+            status_subscribers.remove(subscriber)
+            subscriber.close()
+
+def set_speaker_status(new_status):
+    """Updates the speaker status and pushes the change to every subscriber."""
+    global speaker_status, playback_announced
+    with status_lock:
+        if new_status == speaker_status:
+            return
+        speaker_status = new_status
+        playback_announced = False
+        push_to_subscribers(new_status)
+
+def announce_playback():
     """
-    A worker thread that takes text from a queue, speaks it using pyttsx3,
-    and manages the global 'speaker_status'.
+    Tells the subscribers, once per BUSY period, that audio has reached the
+    ring buffer. BUSY is set as soon as text arrives, before synthesis, so
+    this is the first moment the mics can hear the assistant's voice.
     """
-    global speaker_status
-    
-    try:
-        engine = pyttsx3.init()
-        
-        # Load settings from the config file
-        rate = config['tts']['pyttsx3']['rate']
-        voice_index = config['tts']['pyttsx3']['voice_index']
-        
-        engine.setProperty('rate', rate)
-        
-        voices = engine.getProperty('voices')
-        
-        if 0 <= voice_index < len(voices):
-            engine.setProperty('voice', voices[voice_index].id)
-            print(f"[*] TTS engine initialized with voice: {voices[voice_index].name} (Rate: {rate})")
-        else:
-            print(f"[!] Warning: Voice index {voice_index} is out of range. Using default voice.")
+    global playback_announced
+    with status_lock:
+        if speaker_status != "BUSY" or playback_announced:
+            return
+        playback_announced = True
+        push_to_subscribers("PLAYING")
+
+class RingBuffer:
+    """
+    Fixed-size int16 sample buffer between the synthesis side, which blocks
+    while it is full, and the audio callback, which must never block and
+    plays silence when it runs dry.
+    """
+    def __init__(self, capacity):
+        self.buffer = np.zeros(capacity, dtype=np.int16)
+        self.capacity = capacity
+        self.written = 0 # Total samples written and read; their difference is the fill level.
+        self.read = 0
+        self.clears = 0
+        self.cond = threading.Condition()
+
+    def write(self, samples):
+        """
+        Copies all samples in, waiting for space as the callback consumes them.
+        A clear() while waiting drops the rest of the samples.
+        """
+        offset = 0
+        clears = self.clears
+        while offset < len(samples):
+            with self.cond:
+                while self.written - self.read == self.capacity and self.clears == clears:
+                    self.cond.wait()
+                if self.clears != clears:
+                    return
+                count = min(len(samples) - offset, self.capacity - (self.written - self.read))
+                start = self.written % self.capacity
+                first = min(count, self.capacity - start)
+                self.buffer[start:start + first] = samples[offset:offset + first]
+                self.buffer[:count - first] = samples[offset + first:offset + count]
+                self.written += count
+                offset += count
+
+    def read_into(self, out):
+        """Fills out with buffered samples, padding with silence. Never blocks for long."""
+        with self.cond:
+            count = min(len(out), self.written - self.read)
+            start = self.read % self.capacity
+            first = min(count, self.capacity - start)
+            out[:first] = self.buffer[start:start + first]
+            out[first:count] = self.buffer[:count - first]
+            out[count:] = 0
+            self.read += count
+            self.cond.notify_all()
+
+    def clear(self):
+        """Discards everything buffered so playback falls silent immediately."""
+        with self.cond:
+            self.read = self.written
+            self.clears += 1
+            self.cond.notify_all()
+
+    def wait_until_drained(self):
+        with self.cond:
+            while self.written != self.read:
+                self.cond.wait()
+
+class AudioPlayer:
+    """
+    Plays int16 mono audio through a callback-driven output stream fed from a
+    ring buffer, so consecutive clips play back to back without gaps. The
+    stream is opened at the sample rate of the first clip.
+    """
+    def __init__(self, playback_config):
+        self.pa = pyaudio.PyAudio()
+        self.buffer_seconds = playback_config['buffer_seconds']
+        self.frames_per_buffer = playback_config['frames_per_buffer']
+        self.stream = None
+        self.sample_rate = None
+        self.ring = None
 
+    def _callback(self, in_data, frame_count, time_info, status):
+        out = np.empty(frame_count, dtype=np.int16)
+        self.ring.read_into(out)
+        return out.tobytes(), pyaudio.paContinue
+
+    def _open(self, sample_rate):
+        if self.stream is not None:
+            # A different backend rate; finish what is queued before switching.
+            self.drain()
+            self.stream.close()
+            self.stream = None
+        self.ring = RingBuffer(int(sample_rate * self.buffer_seconds))
+        try:
+            self.stream = self.pa.open(format=pyaudio.paInt16, channels=1, rate=sample_rate, output=True,
+                                       frames_per_buffer=self.frames_per_buffer, stream_callback=self._callback)
+        except Exception:
+            self.ring = None # Nothing would ever drain it.
+            raise
+        self.sample_rate = sample_rate
+
+    def play(self, samples, sample_rate):
+        """Queues a clip behind whatever is playing. Blocks only while the ring buffer is full."""
+        if sample_rate != self.sample_rate:
+            self._open(sample_rate)
+        self.ring.write(samples)
+
+    def drain(self):
+        """Waits until everything queued has been played."""
+        if self.ring is None:
+            return
+        self.ring.wait_until_drained()
+        # The last callback's audio is still in the device buffer.
+        time.sleep(self.stream.get_output_latency())
+
+    def queued_seconds(self):
+        """How long until audio written now will be heard."""
+        if self.ring is None:
+            return 0.0
+        with self.ring.cond:
+            buffered = self.ring.written - self.ring.read
+        return buffered / self.sample_rate + self.stream.get_output_latency()
+
+    def stop(self):
+        """Silences playback at once, dropping all queued audio."""
+        if self.ring is not None:
+            self.ring.clear()
+
+def render(backend, cache, text):
+    """Returns the audio for text, from the cache when it was spoken before."""
+    audio = cache.get(backend, text)
+    if audio is None:
+        audio = backend.synthesize(text)
+        cache.put(backend, text, *audio)
+    return audio
+
+def queue_text(text, trace=None):
+    """Queues received text for speaking and marks the speaker BUSY right away."""
+    global pending_texts
+    with pending_lock:
+        if fences_pending:
+            print(f"[*] Dropped text sent before the barge-in: '{text}'")
+            return
+        pending_texts += 1
+        set_speaker_status("BUSY")
+        text_queue.put((generation, text, trace))
+
+def send_to_central(message):
+    """Returns True if the message went out."""
+    with central_lock:
+        if central_conn is not None:
+            try:
+                central_conn.send(message)
+                return True
+            except OSError as e:
+                print(f"[!] Could not send '{message[:40]}' to central: {e}")
+    return False
+
+def report_trace(trace):
+    """Sends the spans of a traced text back to central, which collects them."""
+    send_to_central(json.dumps({"type": "trace", "id": trace["id"], "spans": trace["spans"]}))
+
+def stop_speaking(audio_queue, player, source):
+    """
+    Barge-in: drops all queued text and audio, silences playback and tells
+    central which mic interrupted, so it can stop generating that answer.
+    Text is then ignored until central's fence says the answer is cancelled.
+    """
+    global pending_texts, generation, fences_pending
+    with pending_lock:
+        generation += 1
+        # Counted before sending, in case the fence comes straight back.
+        fences_pending += 1
+        for pending in (text_queue, audio_queue):
+            while True:
+                try:
+                    pending.get_nowait()
+                except queue.Empty:
+                    break
+        if player is not None:
+            player.stop()
+        pending_texts = 0
+        set_speaker_status("IDLE")
+    print(f"[!] Barge-in from '{source}': stopped speaking.")
+    if not send_to_central(f"STOP:{source}"):
+        # No central to cancel the answer, so no fence will come.
+        with pending_lock:
+            fences_pending = max(0, fences_pending - 1)
+
+def synthesis_worker(config, audio_queue):
+    """
+    Splits queued text into sentences and renders them with the configured TTS
+    backend (or the audio cache). The audio queue only holds a sentence or two,
+    so this renders sentence N+1 while sentence N is playing.
+    """
+    try:
+        tts_config = config['tts']
+        backend = load_tts_backend(tts_config['backend'], tts_config)
+        cache = TTSCache(tts_config['cache'])
     except Exception as e:
-        print(f"[!!!] Failed to initialize pyttsx3 engine: {e}")
-        return # Exit the thread if the engine fails
+        print(f"[!!!] Failed to initialize the TTS engine: {e}")
+        # Keep consuming text so the speaker doesn't stay BUSY forever.
+        while True:
+            text_generation, _, trace = text_queue.get()
+            audio_queue.put((text_generation, END_OF_TEXT, trace))
 
-    while True:
-        text_to_speak = text_queue.get()
-        
-        with status_lock:
-            speaker_status = "BUSY"
-        print(f"[*] Speaking: {text_to_speak}")
-        
+    # Recurring phrases are synthesized up front so they play instantly.
+    for phrase in tts_config['cache']['preload']:
         try:
-            engine.say(text_to_speak)
-            engine.runAndWait()
+            render(backend, cache, phrase)
         except Exception as e:
-            print(f"[!] An error occurred in the TTS worker: {e}")
-        finally:
-            # --- Dynamic Sleep Calculation ---
-            # Calculate a dynamic delay based on the text length to ensure the audio
-            # buffer clears before setting the status to IDLE. This prevents the mic
-            # from starting while the last word is still playing.
-            # Formula: A base delay + a small fraction of time per character.
-            base_delay = 0.2  # Minimum 200ms delay
-            per_char_delay = 0.005  # 5 milliseconds per character
-            dynamic_delay = base_delay + (len(text_to_speak) * per_char_delay)
-            
-            # Cap the delay to a maximum reasonable value (e.g., 2 seconds)
-            final_delay = min(dynamic_delay, 2.0)
-
-            print(f"[*] Using dynamic sleep time: {final_delay:.2f}s")
-            time.sleep(final_delay)
-            
-            with status_lock:
-                speaker_status = "IDLE"
-            print("[*] Finished speaking. Status is now IDLE.")
-            text_queue.task_done()
+            print(f"[!] Could not pre-synthesize '{phrase}': {e}")
+    print(f"[*] TTS cache ready: {cache.describe()}")
+
+    while True:
+        text_generation, text_to_speak, trace = text_queue.get()
+        for sentence in split_sentences(text_to_speak):
+            if text_generation != generation:
+                break # Interrupted by a barge-in
+            sentence = sentence.strip()
+            try:
+                audio = render(backend, cache, sentence)
+            except Exception as e:
+                print(f"[!] An error occurred while synthesizing '{sentence}': {e}")
+                continue
+            if trace is not None and "tts" not in trace["spans"]:
+                add_span(trace, "tts", trace["received"])
+            audio_queue.put((text_generation, audio + (sentence,), trace))
+        audio_queue.put((text_generation, END_OF_TEXT, trace))
+
+def playback_worker(audio_queue, player):
+    """Plays rendered sentences back to back and manages the global 'speaker_status'."""
+    global pending_texts
+    while True:
+        item_generation, item, trace = audio_queue.get()
+        if item_generation != generation:
+            continue # Queued before a barge-in
+        if item is not END_OF_TEXT:
+            if player is None:
+                continue
+            samples, sample_rate, sentence = item
+            print(f"[*] Speaking: {sentence}")
+            try:
+                if trace is not None and "first_audio" not in trace:
+                    # Heard once the audio already in the ring buffer has played.
+                    trace["first_audio"] = time.time() + player.queued_seconds()
+                player.play(samples, sample_rate)
+                announce_playback()
+            except Exception as e:
+                print(f"[!] An error occurred during playback: {e}")
+            continue
+
+        if trace is not None:
+            if "first_audio" in trace:
+                add_span(trace, "playback", trace["first_audio"], time.time() + player.queued_seconds())
+            report_trace(trace)
+
+        with pending_lock:
+            if item_generation != generation:
+                continue
+            pending_texts -= 1
+            finished = pending_texts == 0
+        if not finished:
+            continue
+        if player is not None:
+            # Stay BUSY until the audio has actually left the speakers.
+            player.drain()
+        with pending_lock:
+            if pending_texts == 0:
+                set_speaker_status("IDLE")
+                print("[*] Finished speaking. Status is now IDLE.")
+
+def serve_central(endpoint):
+    """Speaks the text central sends until its link closes."""
+    global central_conn, fences_pending
+    with central_lock:
+        central_conn = endpoint
+    with pending_lock:
+        # A new central connection owes no fences.
+        fences_pending = 0
+    try:
+        for text in endpoint:
+            trace = None
+            if text.startswith("{"):
+                # Traced text: {"text": ..., "trace": id}, or a fence: {"type": "fence"}
+                try:
+                    message = json.loads(text)
+                    if message.get("type") == "fence":
+                        with pending_lock:
+                            fences_pending = max(0, fences_pending - 1)
+                        continue
+                    text = message["text"]
+                    trace = {"id": message["trace"], "spans": {}, "received": time.time()}
+                except (json.JSONDecodeError, KeyError, TypeError, AttributeError) as e:
+                    print(f"[!] Received malformed text message: {e}")
+                    continue
+            if text:
+                print(f"[*] Received text to speak: '{text}'")
+                queue_text(text, trace)
+    finally:
+        with central_lock:
+            if central_conn is endpoint:
+                central_conn = None
 
 def handle_connection(conn, addr, name="Client"):
     """Handles a connection from the central service."""
     print(f"[+] {name} connected from {addr}")
     try:
-        while True:
-            length_bytes = conn.recv(4)
-            if not length_bytes: break
-            length = struct.unpack('>I', length_bytes)[0]
-            
-            data = b""
-            while len(data) < length:
-                packet = conn.recv(length - len(data))
-                if not packet: break
-                data += packet
-            
-            if data:
-                text = data.decode('utf-8')
-                print(f"[*] Received text to speak: '{text}'")
-                text_queue.put(text)
+        serve_central(SocketEndpoint(conn))
     except ConnectionResetError:
         print(f"[-] {name} at {addr} disconnected.")
+    except FrameTooLarge as e:
+        print(f"[!] Dropping {name} at {addr}: {e}")
     finally:
         print(f"[-] Connection closed for {addr}")
         conn.close()
@@ -139,12 +418,65 @@ def start_server(host, port, handler, handler_args=()):
         conn, addr = server_socket.accept()
         handler(conn, addr, *handler_args)
 
-def status_server_handler(conn, addr):
-    """Special handler for the status server; sends status and closes."""
-    with conn:
-        with status_lock:
-            current_status = speaker_status
-        conn.sendall(current_status.encode('utf-8'))
+def status_server_handler(conn, addr, audio_queue, player):
+    """
+    Special handler for the status server. The connection stays open as a
+    subscription: the current status is sent right away and every later
+    BUSY/IDLE transition is pushed as it happens, plus PLAYING once the audio
+    of a BUSY period starts. Subscribers can send STOP back to interrupt
+    playback (barge-in).
+    """
+    print(f"[+] Status subscriber connected from {addr}")
+    conn.settimeout(1.0) # A stuck subscriber must not hold up status changes
+    add_status_subscriber(SocketEndpoint(conn), addr, audio_queue, player)
+
+def add_status_subscriber(endpoint, name, audio_queue, player):
+    """Sends the current status to a new subscriber and starts reading its commands."""
+    with status_lock:
+        try:
+            endpoint.send(speaker_status)
+            if playback_announced:
+                endpoint.send("PLAYING")
+        except OSError:
+            endpoint.close()
+            return
+        status_subscribers.append(endpoint)
+    threading.Thread(target=read_subscriber_commands, args=(endpoint, name, audio_queue, player), daemon=True).start()
+
+def read_subscriber_commands(endpoint, name, audio_queue, player):
+    """Waits for commands from a status subscriber until it disconnects."""
+    try:
+        for command in endpoint:
+            # STOP:<client id of the mic that heard the user>
+            if command.startswith("STOP:"):
+                stop_speaking(audio_queue, player, command[len("STOP:"):])
+    except (OSError, ValueError): # ValueError: select on a socket already closed by a failed push
+        pass
+    with status_lock:
+        if endpoint in status_subscribers:
+            status_subscribers.remove(endpoint)
+            endpoint.close()
+    print(f"[-] Status subscriber {name} disconnected.")
+
+def start_speaker(config, player=None):
+    """
+    Opens the audio output and starts the synthesis and playback workers.
+    Returns (audio_queue, player); player is None if no output could be opened.
+    A player object given here (see testings/replay_benchmark.py) replaces
+    the sound card.
+    """
+    print(f"[*] Starting Speaker Service (using {config['tts']['backend']})...")
+
+    # Bounded, so synthesis runs at most lookahead_sentences ahead of playback.
+    audio_queue = queue.Queue(maxsize=config['tts']['playback']['lookahead_sentences'])
+    if player is None:
+        try:
+            player = AudioPlayer(config['tts']['playback'])
+        except Exception as e:
+            print(f"[!!!] Failed to open the audio output: {e}")
+    threading.Thread(target=synthesis_worker, args=(config, audio_queue), daemon=True).start()
+    threading.Thread(target=playback_worker, args=(audio_queue, player), daemon=True).start()
+    return audio_queue, player
 
 if __name__ == "__main__":
     config = load_config()
@@ -161,10 +493,8 @@ if __name__ == "__main__":
         print("[!!!] Please ensure your config.yaml has a 'ports' section with a 'speaker' subsection containing all required hosts and ports.")
         sys.exit(1)
 
-    print("[*] Starting Speaker Service (using pyttsx3)...")
-    
-    threading.Thread(target=tts_worker, args=(config,), daemon=True).start()
-    threading.Thread(target=start_server, args=(status_host, status_port, status_server_handler), daemon=True).start()
+    audio_queue, player = start_speaker(config)
+    threading.Thread(target=start_server, args=(status_host, status_port, status_server_handler, (audio_queue, player)), daemon=True).start()
     
     start_server(text_host, text_port, handle_connection, handler_args=("Central service",))
 
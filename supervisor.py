@@ -0,0 +1,195 @@
+#!/home/nischay/linenv311/bin/python
+"""
+Headless supervisor for the B.R.I.A.N. services, configured under
+'supervisor' in config.yaml.
+
+Every service is started as soon as the services it depends on are ready,
+so independent ones start in parallel. A service is ready once its
+ready_port accepts a connection; the probe hangs up straight away. A
+service that exits is restarted after a delay that doubles on every crash,
+and starts again from the initial delay once it has stayed up for
+stable_seconds. Startup times are reported per service, and again after
+every restart.
+
+The services' output is relayed here, each line prefixed with the service's
+name. Ctrl-C stops them in reverse dependency order.
+"""
+import asyncio
+import signal
+import sys
+import time
+import yaml
+
+def load_config():
+    """Loads the main configuration file."""
+    try:
+        with open("config.yaml", "r") as f:
+            return yaml.safe_load(f)
+    except FileNotFoundError:
+        print("[!!!] CRITICAL: config.yaml not found.")
+        sys.exit(1)
+
+def dependency_order(services):
+    """Returns the service names with every service after its dependencies. Raises ValueError on a cycle."""
+    order = []
+    visiting = set()
+    def visit(name, path):
+        if name in order:
+            return
+        if name in visiting:
+            raise ValueError(f"dependency cycle: {' -> '.join(path + [name])}")
+        if name not in services:
+            raise ValueError(f"'{path[-1]}' depends on unknown service '{name}'")
+        visiting.add(name)
+        for dependency in services[name].depends_on:
+            visit(dependency, path + [name])
+        visiting.discard(name)
+        order.append(name)
+    for name in services:
+        visit(name, [])
+    return order
+
+class Service:
+    def __init__(self, name, settings, ports_config):
+        self.name = name
+        self.script = settings['script']
+        self.depends_on = list(settings['depends_on'])
+        # "section.key" under 'ports'; the host is the section's matching *host key.
+        self.probe_address = None
+        if settings['ready_port']:
+            section, key = settings['ready_port'].split(".")
+            host = ports_config[section][key.replace("port", "host")]
+            # A wildcard listener is probed over loopback.
+            self.probe_address = ("127.0.0.1" if host == "0.0.0.0" else host, ports_config[section][key])
+        self.ready = asyncio.Event()
+        self.process = None
+        self.restarts = 0
+        self.startup_seconds = None
+
+class Supervisor:
+    def __init__(self, config):
+        try:
+            self.python = config['paths']['python_executable']
+            self.project_directory = config['paths']['project_directory']
+            settings = config['supervisor']
+            self.probe_interval = settings['probe_interval_seconds']
+            self.ready_timeout = settings['ready_timeout_seconds']
+            self.initial_backoff = settings['restart_backoff_seconds']
+            self.max_backoff = settings['restart_backoff_max_seconds']
+            self.stable_seconds = settings['stable_seconds']
+            self.services = {name: Service(name, service_settings, config['ports'])
+                             for name, service_settings in settings['services'].items()}
+        except KeyError as e:
+            print(f"[!!!] CRITICAL: Missing configuration in config.yaml for the supervisor. Key not found: {e}")
+            sys.exit(1)
+        try:
+            self.order = dependency_order(self.services)
+        except ValueError as e:
+            print(f"[!!!] CRITICAL: Invalid supervisor services in config.yaml: {e}")
+            sys.exit(1)
+        self.started = None
+
+    async def run(self):
+        self.started = time.monotonic()
+        print(f"[*] Supervising {len(self.services)} services: {', '.join(self.order)}")
+        try:
+            async with asyncio.TaskGroup() as services:
+                for name in self.order:
+                    services.create_task(self.supervise(self.services[name]))
+                services.create_task(self.report_startup())
+        finally:
+            await self.stop_all()
+
+    async def supervise(self, service):
+        """Starts a service once its dependencies are ready, and restarts it whenever it exits."""
+        backoff = self.initial_backoff
+        while True:
+            waiting = [self.services[name] for name in service.depends_on if not self.services[name].ready.is_set()]
+            if waiting:
+                print(f"[*] {service.name} is waiting for {', '.join(s.name for s in waiting)}.")
+                await asyncio.gather(*(dependency.ready.wait() for dependency in waiting))
+
+            launched = time.monotonic()
+            service.process = await asyncio.create_subprocess_exec(
+                self.python, "-u", service.script, cwd=self.project_directory,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+                # Ctrl-C only reaches the supervisor, which then stops the services in order.
+                start_new_session=True)
+            relay = asyncio.create_task(self.relay_output(service))
+            print(f"[*] Started {service.name} (pid {service.process.pid}).")
+
+            if await self.wait_until_ready(service):
+                service.startup_seconds = time.monotonic() - launched
+                service.ready.set()
+                print(f"[+] {service.name} ready in {service.startup_seconds:.1f}s "
+                      f"({time.monotonic() - self.started:.1f}s after the supervisor started).")
+            elif service.process.returncode is None:
+                print(f"[!] {service.name} was not ready after {self.ready_timeout}s. Killing it.")
+                service.process.kill()
+
+            returncode = await service.process.wait()
+            await relay
+            service.ready.clear()
+            uptime = time.monotonic() - launched
+            if uptime >= self.stable_seconds:
+                backoff = self.initial_backoff
+            service.restarts += 1
+            print(f"[!] {service.name} exited with code {returncode} after {uptime:.1f}s. "
+                  f"Restarting in {backoff:g}s (restart {service.restarts}).")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def wait_until_ready(self, service):
+        """Probes the service's ready port until it accepts a connection. False if it exits or times out first."""
+        deadline = time.monotonic() + self.ready_timeout
+        while time.monotonic() < deadline:
+            if service.process.returncode is not None:
+                return False
+            if service.probe_address is None:
+                return True
+            try:
+                _, writer = await asyncio.wait_for(asyncio.open_connection(*service.probe_address), self.probe_interval)
+                writer.close()
+                return True
+            except (OSError, asyncio.TimeoutError):
+                await asyncio.sleep(self.probe_interval)
+        return False
+
+    async def relay_output(self, service):
+        """Prints the service's output, each line prefixed with its name."""
+        while True:
+            line = await service.process.stdout.readline()
+            if not line:
+                return
+            print(f"{service.name:<16}| {line.decode('utf-8', errors='replace').rstrip()}")
+
+    async def report_startup(self):
+        """Prints the startup time of every service once all of them are ready for the first time."""
+        await asyncio.gather(*(service.ready.wait() for service in self.services.values()))
+        print(f"[+] All services ready in {time.monotonic() - self.started:.1f}s:")
+        for name in self.order:
+            print(f"    {name:<16} {self.services[name].startup_seconds:6.1f}s")
+
+    async def stop_all(self):
+        """Stops the services, dependents first, killing any that don't exit within five seconds."""
+        for name in reversed(self.order):
+            process = self.services[name].process
+            if process is None or process.returncode is not None:
+                continue
+            print(f"[*] Stopping {name}...")
+            process.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(process.wait(), 5)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+
+def main():
+    supervisor = Supervisor(load_config())
+    try:
+        asyncio.run(supervisor.run())
+    except KeyboardInterrupt:
+        print("\n[*] Supervisor stopped.")
+
+if __name__ == "__main__":
+    main()
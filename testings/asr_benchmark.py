@@ -0,0 +1,92 @@
+import argparse
+import glob
+import os
+import sys
+import time
+import wave
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from asr_backends import BACKENDS, load_asr_backend
+
+SAMPLE_RATE = 16000
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_wav(path):
+    """Loads a 16-bit PCM WAV file as float32 mono audio at 16 kHz."""
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM WAV files are supported.")
+        rate = wav.getframerate()
+        channels = wav.getnchannels()
+        frames = wav.readframes(wav.getnframes())
+
+    audio = np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768.0
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1)
+    if rate != SAMPLE_RATE:
+        # Linear resampling is good enough for timing comparisons.
+        duration = len(audio) / rate
+        target = np.linspace(0, duration, int(duration * SAMPLE_RATE), endpoint=False)
+        audio = np.interp(target, np.arange(len(audio)) / rate, audio).astype(np.float32)
+    return audio
+
+def benchmark(backend_name, model_name, asr_config, fixtures):
+    """Transcribes every fixture once and returns (load time, rows)."""
+    started = time.perf_counter()
+    asr = load_asr_backend(backend_name, model_name, asr_config)
+    load_time = time.perf_counter() - started
+
+    # Warm-up so one-off allocations don't count against the first fixture.
+    asr.transcribe(fixtures[0][1][:SAMPLE_RATE])
+
+    rows = []
+    for name, audio in fixtures:
+        started = time.perf_counter()
+        text = asr.transcribe(audio)
+        elapsed = time.perf_counter() - started
+        rows.append((name, len(audio) / SAMPLE_RATE, elapsed, text))
+    return load_time, rows
+
+def main():
+    config_path = os.path.join(PROJECT_DIR, "config.yaml")
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    parser = argparse.ArgumentParser(description="Reports the real-time factor of each ASR backend.")
+    parser.add_argument("fixtures", nargs="?", default=os.path.join(PROJECT_DIR, "testings", "fixtures"),
+                        help="Directory of WAV files to transcribe.")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--model", default=config['models']['whisper'])
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.fixtures, "*.wav")))
+    if not paths:
+        print(f"[!!!] No WAV fixtures found in {args.fixtures}. Record some, or synthesize them with "
+              f"testings/make_fixtures.py.")
+        sys.exit(1)
+    fixtures = [(os.path.basename(path), load_wav(path)) for path in paths]
+    total_audio = sum(len(audio) for _, audio in fixtures) / SAMPLE_RATE
+    print(f"[*] {len(fixtures)} fixtures, {total_audio:.1f}s of audio, model '{args.model}'")
+
+    summary = []
+    for backend_name in args.backends:
+        print(f"\n--- {backend_name} ---")
+        try:
+            load_time, rows = benchmark(backend_name, args.model, config['models']['asr'], fixtures)
+        except ImportError as e:
+            print(f"[!] Skipping {backend_name}: {e}")
+            continue
+        print(f"[*] Model load: {load_time:.1f}s")
+        for name, duration, elapsed, text in rows:
+            print(f"  {name:<30} {duration:6.1f}s audio  {elapsed:6.2f}s  RTF {elapsed / duration:5.2f}  | {text[:60]}")
+        total_time = sum(row[2] for row in rows)
+        summary.append((backend_name, total_time / total_audio))
+
+    print("\n--- Summary (RTF < 1 is faster than real time) ---")
+    for backend_name, rtf in summary:
+        print(f"  {backend_name:<16} RTF {rtf:.3f}")
+
+if __name__ == "__main__":
+    main()
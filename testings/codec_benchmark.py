@@ -0,0 +1,86 @@
+import argparse
+import glob
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from audio_codecs import CODECS, load_codec
+from asr_benchmark import SAMPLE_RATE, load_wav
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The mic streams this much audio per frame (streaming.chunk_seconds).
+CHUNK_SECONDS = 0.25
+
+def synthetic_speech(seconds=6, seed=0):
+    """A voiced, syllable-modulated signal with background noise, for when no fixtures exist."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = 120 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    voice = sum(np.sin(k * phase) / k for k in range(1, 12))
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    return (0.3 * voice * syllables + 0.01 * rng.standard_normal(len(t))).astype(np.float32)
+
+def to_pcm(audio):
+    return (np.clip(audio, -1, 1) * 32767).astype(np.int16).tobytes()
+
+def run(codec_name, pcm, bandwidth):
+    """
+    Streams the clip chunk by chunk through a fresh encoder and decoder.
+    Returns (bytes on the wire, encode+decode seconds, mean per-chunk latency),
+    where latency is codec time plus the transfer time at `bandwidth` bytes/s.
+    """
+    encoder = load_codec(codec_name)
+    decoder = load_codec(codec_name)
+    chunk_bytes = int(CHUNK_SECONDS * SAMPLE_RATE) * 2
+    wire_bytes = 0
+    codec_time = 0.0
+    latencies = []
+    for start in range(0, len(pcm), chunk_bytes):
+        started = time.perf_counter()
+        payload = encoder.encode(pcm[start:start + chunk_bytes])
+        if start + chunk_bytes >= len(pcm):
+            payload += encoder.flush()
+        if payload:
+            decoder.decode(payload)
+        elapsed = time.perf_counter() - started
+        codec_time += elapsed
+        wire_bytes += len(payload) + 4 # 4-byte frame header
+        latencies.append(elapsed + (len(payload) + 4) / bandwidth)
+    return wire_bytes, codec_time, sum(latencies) / len(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares bytes on the wire and latency of the mic audio codecs.")
+    parser.add_argument("fixtures", nargs="?", default=os.path.join(PROJECT_DIR, "testings", "fixtures"),
+                        help="Directory of WAV files; synthetic audio is used if it has none.")
+    parser.add_argument("--bandwidth-kbps", type=float, default=1000,
+                        help="Simulated link speed for the latency estimate.")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.fixtures, "*.wav")))
+    if paths:
+        clips = [load_wav(path) for path in paths]
+    else:
+        print(f"[*] No WAV fixtures in {args.fixtures}; using synthetic speech.")
+        clips = [synthetic_speech(seed=seed) for seed in range(3)]
+    pcm = b"".join(to_pcm(clip) for clip in clips)
+    seconds = len(pcm) / 2 / SAMPLE_RATE
+    bandwidth = args.bandwidth_kbps * 1000 / 8
+
+    print(f"--- Codec Benchmark: {seconds:.1f}s of audio, {CHUNK_SECONDS}s chunks, {args.bandwidth_kbps:.0f} kbit/s link ---")
+    print(f"{'codec':>6} | {'bytes':>10} | {'ratio':>6} | {'KB/s':>6} | {'codec ms':>9} | {'chunk latency ms':>16}")
+    print("-" * 70)
+    baseline = None
+    for name, codec in CODECS.items():
+        if not codec.available():
+            print(f"{name:>6} | not installed")
+            continue
+        wire_bytes, codec_time, latency = run(name, pcm, bandwidth)
+        baseline = baseline or wire_bytes
+        print(f"{name:>6} | {wire_bytes:>10} | {wire_bytes / baseline:>6.2f} | {wire_bytes / seconds / 1024:>6.1f} | "
+              f"{codec_time * 1000:>9.1f} | {latency * 1000:>16.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Configuration ---
+HOST = "127.0.0.1"
+PORT = 11434
+
+DEFAULT_ANSWER = (
+    "Packaging is the process of enclosing a product to protect it. "
+    "Here are some key aspects to consider:\n\n"
+    "1. **Protection**: Packaging must safeguard the product during transport.\n"
+    "2. **Attractiveness**: Good design can influence purchasing decisions.\n\n"
+    "In conclusion, packaging plays a vital role in the success of products."
+)
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """
+    Answers /api/generate like Ollama does, with a canned answer generated at a
+    fixed token rate. Useful for measuring time-to-first-audio without a GPU.
+    """
+    answer = DEFAULT_ANSWER
+    tokens_per_second = 20.0
+    first_token_latency = 0.5
+    # Simulated model load, paid by the first request and again once keep_alive runs out.
+    load_time = 0.0
+    loaded_until = 0.0
+    load_lock = threading.Lock()
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        model = request.get("model", "fake")
+        # Split into word-sized tokens, keeping the whitespace attached.
+        tokens = re.findall(r"\S+\s*", self.answer)
+        started = time.time()
+        self.load_model(request.get("keep_alive", "5m"))
+        if not request.get("prompt"):
+            # Like Ollama, an empty prompt only loads the model.
+            self.write_json({"model": model, "response": "", "done": True, "done_reason": "load"})
+            return
+        # Like Ollama, hand back the grown context so follow-ups can pass it in again.
+        context = request.get("context", []) + list(range(len(request.get("prompt", "").split()) + len(tokens)))
+
+        if request.get("stream", True):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            time.sleep(self.first_token_latency)
+            for token in tokens:
+                self.write_line({"model": model, "response": token, "done": False})
+                time.sleep(1.0 / self.tokens_per_second)
+            self.write_line({"model": model, "response": "", "done": True, "context": context,
+                             "total_duration": int((time.time() - started) * 1e9)})
+        else:
+            time.sleep(self.first_token_latency + len(tokens) / self.tokens_per_second)
+            self.write_json({"model": model, "response": self.answer, "done": True, "context": context})
+
+    def load_model(self, keep_alive):
+        """Sleeps for load_time if the model isn't loaded, then extends keep-alive."""
+        with FakeOllamaHandler.load_lock:
+            now = time.time()
+            if now >= FakeOllamaHandler.loaded_until:
+                time.sleep(self.load_time)
+                now = time.time()
+            FakeOllamaHandler.loaded_until = now + parse_duration(keep_alive)
+
+    def write_json(self, message):
+        body = json.dumps(message).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def write_line(self, message):
+        self.wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        print(f"[*] Fake Ollama: {format % args}")
+
+def parse_duration(value):
+    """Parses an Ollama keep_alive value such as "30m", "10s" or a number of seconds."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    units = {"s": 1, "m": 60, "h": 3600}
+    return float(value[:-1]) * units[value[-1]] if value[-1] in units else float(value)
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Ollama generate API.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--tokens-per-second", type=float, default=FakeOllamaHandler.tokens_per_second)
+    parser.add_argument("--latency", type=float, default=FakeOllamaHandler.first_token_latency,
+                        help="Seconds before the first token is produced.")
+    parser.add_argument("--load-time", type=float, default=FakeOllamaHandler.load_time,
+                        help="Seconds a cold model takes to load.")
+    args = parser.parse_args()
+
+    FakeOllamaHandler.tokens_per_second = args.tokens_per_second
+    FakeOllamaHandler.first_token_latency = args.latency
+    FakeOllamaHandler.load_time = args.load_time
+
+    server = ThreadingHTTPServer((args.host, args.port), FakeOllamaHandler)
+    print(f"[*] Fake Ollama listening on {args.host}:{args.port} "
+          f"({args.tokens_per_second} tokens/s, {args.latency}s first-token latency)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[*] Shutting down fake Ollama.")
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
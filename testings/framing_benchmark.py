@@ -0,0 +1,71 @@
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from framing import FrameReader, send_frame
+
+# --- Benchmark Configuration ---
+FRAME_SIZES = [1024, 64 * 1024, 1024 * 1024]
+# Roughly the same amount of data is moved for every frame size.
+TOTAL_BYTES = 256 * 1024 * 1024
+
+def legacy_send(sock, payload):
+    """The original two-call sender used by the services."""
+    sock.sendall(struct.pack('>I', len(payload)))
+    sock.sendall(payload)
+
+def legacy_read(conn):
+    """The original `data += packet` receive loop used by the services."""
+    length_bytes = conn.recv(4)
+    if not length_bytes: return None
+    length = struct.unpack('>I', length_bytes)[0]
+    data = b""
+    while len(data) < length:
+        packet = conn.recv(length - len(data))
+        if not packet: break
+        data += packet
+    return data
+
+def run(frame_size, count, sender, make_reader):
+    """Pushes `count` frames through a socket pair and returns MB/s."""
+    left, right = socket.socketpair()
+    payload = os.urandom(frame_size)
+
+    def send_all():
+        for _ in range(count):
+            sender(left, payload)
+        left.shutdown(socket.SHUT_WR)
+
+    read_frame = make_reader(right)
+    thread = threading.Thread(target=send_all, daemon=True)
+    started = time.perf_counter()
+    thread.start()
+    received = 0
+    while True:
+        frame = read_frame()
+        if frame is None:
+            break
+        received += len(frame)
+    elapsed = time.perf_counter() - started
+    thread.join()
+    left.close()
+    right.close()
+    assert received == frame_size * count, "Frames were lost in transit."
+    return received / elapsed / (1024 * 1024)
+
+def main():
+    print("--- Framing Throughput Benchmark ---")
+    print(f"{'frame size':>12} | {'legacy MB/s':>12} | {'framing MB/s':>12} | {'speedup':>8}")
+    print("-" * 54)
+    for frame_size in FRAME_SIZES:
+        count = max(1, TOTAL_BYTES // frame_size)
+        legacy = run(frame_size, count, legacy_send, lambda conn: lambda: legacy_read(conn))
+        framed = run(frame_size, count, send_frame, lambda conn: FrameReader(conn).read_frame)
+        print(f"{frame_size // 1024:>9} KB | {legacy:>12.1f} | {framed:>12.1f} | {framed / legacy:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
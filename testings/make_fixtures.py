@@ -0,0 +1,79 @@
+"""
+Writes spoken WAV fixtures for asr_benchmark.py and replay_benchmark.py,
+rendered with one of the speaker's TTS backends. Every fixture is a wake word
+followed by a command, so each one is a complete turn for the replay
+benchmark. Recordings of real voices are more representative; they can go in
+the same directory instead.
+"""
+import argparse
+import os
+import sys
+import wave
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tts_backends import BACKENDS, load_tts_backend
+
+SAMPLE_RATE = 16000
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMMANDS = [
+    "what time is it?",
+    "what's the weather like today?",
+    "tell me a short joke.",
+    "how far away is the moon?",
+    "set a timer for ten minutes.",
+    "what is the capital of Australia?",
+]
+# Quiet before and after the speech, so the VAD sees it start and end.
+PADDING_SECONDS = 0.5
+
+def to_fixture(samples, sample_rate):
+    """Resamples int16 TTS output to 16 kHz and pads it with silence."""
+    audio = np.asarray(samples, dtype=np.float32)
+    if sample_rate != SAMPLE_RATE:
+        duration = len(audio) / sample_rate
+        target = np.linspace(0, duration, int(duration * SAMPLE_RATE), endpoint=False)
+        audio = np.interp(target, np.arange(len(audio)) / sample_rate, audio)
+    padding = np.zeros(int(PADDING_SECONDS * SAMPLE_RATE), dtype=np.float32)
+    return np.concatenate([padding, audio, padding]).astype(np.int16)
+
+def write_wav(path, samples):
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(samples.tobytes())
+
+def main():
+    config_path = os.path.join(PROJECT_DIR, "config.yaml")
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    parser = argparse.ArgumentParser(description="Synthesizes spoken WAV fixtures for the benchmarks.")
+    parser.add_argument("output", nargs="?", default=os.path.join(PROJECT_DIR, "testings", "fixtures"),
+                        help="Directory to write the WAV files to.")
+    parser.add_argument("--backend", default=config['tts']['backend'],
+                        choices=[name for name in BACKENDS if name != "silent"],
+                        help="TTS backend, configured under 'tts' in config.yaml.")
+    parser.add_argument("--awake", action="store_true",
+                        help="Leave out the wake word (for replay_benchmark.py --awake).")
+    args = parser.parse_args()
+
+    try:
+        backend = load_tts_backend(args.backend, config['tts'])
+    except ImportError as e:
+        print(f"[!!!] CRITICAL: The {args.backend} backend is not installed: {e}")
+        sys.exit(1)
+
+    os.makedirs(args.output, exist_ok=True)
+    wake_word = config['wake_words'][0]
+    for i, command in enumerate(COMMANDS):
+        text = command[0].upper() + command[1:] if args.awake else f"{wake_word}, {command}"
+        path = os.path.join(args.output, f"turn_{i:02d}.wav")
+        write_wav(path, to_fixture(*backend.synthesize(text)))
+        print(f"[+] {path}: {text}")
+    print(f"[*] Wrote {len(COMMANDS)} fixtures with the {args.backend} backend.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+"""
+Replays WAV fixtures through the whole voice pipeline and reports its
+latency and throughput, without a microphone, speakers or Ollama.
+
+The fixtures are fed to the real mic loop (VAD, endpointing, codec and the
+mic->transcriber protocol) as if spoken into the microphone, one turn at a
+time: the next fixture starts once the previous answer has been read out.
+Transcriber, central, session manager and speaker run in this process,
+joined like in monolith.py; Ollama is replaced by testings/fake_ollama.py,
+the TTS engine by the "silent" backend and the sound card by a player that
+only keeps time. Stage latencies come from the services' own tracing.
+
+Everything the run depends on is fixed (fixtures, fake LLM timings, seeded
+background noise, fresh caches), so reports of two commits can be compared
+with --baseline. --speed plays the audio in and out faster than real time;
+compute (ASR, synthesis) is never scaled.
+
+Without recordings of your own, testings/make_fixtures.py synthesizes a set
+of turns into the default fixtures directory.
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import central
+import mic
+import session_mgr
+import speaker
+import transcribe
+from transport import local_link
+from asr_benchmark import SAMPLE_RATE, load_wav
+from codec_benchmark import to_pcm
+from fake_ollama import FakeOllamaHandler
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Stages compared against a baseline; the rest are reported only.
+COMPARED_STAGES = ("asr", "llm_first_token", "tts", "time_to_first_audio", "end_to_end")
+
+def start_thread(target, *args, name=None):
+    threading.Thread(target=target, args=args, name=name, daemon=True).start()
+
+class ReplayStream:
+    """
+    Stands in for the mic's PyAudio input stream. read() returns the fixture
+    being played, or low background noise between fixtures, paced at `speed`
+    times real time like a sound card would deliver it.
+    """
+    def __init__(self, speed, noise_level, seed=0):
+        self.speed = speed
+        self.noise_level = noise_level
+        self.rng = np.random.default_rng(seed)
+        self.pending = b""
+        self.samples_read = 0
+        self.started = None
+        self.cond = threading.Condition()
+
+    def noise(self, samples):
+        return to_pcm(self.noise_level * self.rng.standard_normal(samples))
+
+    def play(self, audio):
+        """Queues a fixture (float32 audio) to be read next."""
+        with self.cond:
+            self.pending += to_pcm(audio)
+
+    def wait_until_played(self):
+        with self.cond:
+            while self.pending:
+                self.cond.wait()
+
+    def wait_until_read(self, seconds):
+        """Waits until the mic has read `seconds` of audio in total."""
+        with self.cond:
+            while self.samples_read < seconds * SAMPLE_RATE:
+                self.cond.wait()
+
+    def read(self, frames, exception_on_overflow=True):
+        if self.started is None:
+            self.started = time.monotonic()
+        due = self.started + (self.samples_read + frames) / (SAMPLE_RATE * self.speed)
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        with self.cond:
+            data, self.pending = self.pending[:frames * 2], self.pending[frames * 2:]
+            self.samples_read += frames
+            self.cond.notify_all()
+        if len(data) < frames * 2:
+            data += self.noise(frames - len(data) // 2)
+        return data
+
+class NullPlayer:
+    """
+    Stands in for speaker.AudioPlayer: 'plays' audio by keeping time, `speed`
+    times faster than real time, and blocks like a full ring buffer would.
+    """
+    def __init__(self, playback_config, speed):
+        self.buffer_seconds = playback_config['buffer_seconds'] / speed
+        self.speed = speed
+        self.playing_until = 0.0
+        self.played_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def play(self, samples, sample_rate):
+        seconds = len(samples) / sample_rate
+        with self.lock:
+            now = time.time()
+            self.playing_until = max(now, self.playing_until) + seconds / self.speed
+            self.played_seconds += seconds
+            wait = self.playing_until - now - self.buffer_seconds
+        if wait > 0:
+            time.sleep(wait)
+
+    def drain(self):
+        time.sleep(self.queued_seconds())
+
+    def queued_seconds(self):
+        with self.lock:
+            return max(0.0, self.playing_until - time.time())
+
+    def stop(self):
+        with self.lock:
+            self.playing_until = time.time()
+
+class UIRecorder:
+    """Reads what central sends to the UI, which tells the harness when a turn is over."""
+    def __init__(self, endpoint):
+        self.messages = []
+        self.cond = threading.Condition()
+        start_thread(self.run, endpoint, name="ui")
+
+    def run(self, endpoint):
+        for message in endpoint:
+            with self.cond:
+                self.messages.append(message)
+                self.cond.notify_all()
+
+    def mark(self):
+        with self.cond:
+            return len(self.messages)
+
+    def wait_for(self, prefix, since, timeout):
+        """Returns the first message after index `since` that starts with prefix, or None after timeout."""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                for message in self.messages[since:]:
+                    if message.startswith(prefix):
+                        return message
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+
+def wait_until_quiet(idle, seconds):
+    """Waits until the speaker has been idle for `seconds` in a row."""
+    quiet_since = None
+    while True:
+        now = time.monotonic()
+        if not idle.is_set():
+            quiet_since = None
+        elif quiet_since is None:
+            quiet_since = now
+        elif now - quiet_since >= seconds:
+            return
+        time.sleep(0.02)
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def git_commit():
+    """The checked-out commit, marked "-dirty" when the tree has changes."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=PROJECT_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if dirty else "")
+
+def benchmark_config(config, args, workdir, ollama_port):
+    """Points the services at the fake LLM, the silent TTS and fresh state in workdir."""
+    config['paths']['session_log_directory'] = os.path.join(workdir, "sessions")
+    config['models']['ollama_endpoint'] = f"http://127.0.0.1:{ollama_port}/api/generate"
+    config['models']['ollama_stream'] = not args.no_stream
+    if args.model:
+        config['models']['whisper'] = args.model
+    # Every question goes to the LLM, so runs don't depend on earlier ones.
+    config['response_cache']['enabled'] = False
+    config['response_cache']['file'] = os.path.join(workdir, "response_cache.json")
+    config['response_cache']['embedding_model'] = ""
+    config['tts']['backend'] = "silent"
+    config['tts']['cache']['directory'] = os.path.join(workdir, "tts_cache")
+    config['tracing'].update(enabled=True, max_traces=max(config['tracing']['max_traces'], len(args.fixture_paths)),
+                             export_interval_seconds=3600, json_file="", prometheus_file="")
+    config['ports']['transcriber']['mic_host'] = "127.0.0.1"
+    config['ports']['transcriber']['mic_port'] = free_port()
+    return config
+
+def start_pipeline(config, args):
+    """
+    Starts every service in this process and the mic loop on a replay stream.
+    Returns (stream, ui, speaker_status, player, orchestrator, loop).
+    """
+    links = {}
+    links["transcriber"], transcriber_central = local_link()
+    links["speaker"], speaker_central = local_link()
+    links["session"], session_central = local_link()
+    links["ui"], ui_central = local_link()
+
+    manager = session_mgr.start_session_manager(config)
+    start_thread(session_mgr.record_interactions, session_central, manager, name="session")
+
+    player = NullPlayer(config['tts']['playback'], args.speed)
+    audio_queue, player = speaker.start_speaker(config, player)
+    start_thread(speaker.serve_central, speaker_central, name="speaker")
+
+    asr, kws = transcribe.load_models(config)
+    pipeline = transcribe.TranscriberPipeline(config, asr, kws, central=transcriber_central)
+    pipeline.start_workers()
+    start_thread(pipeline.serve_mics, name="mic-server")
+
+    ui = UIRecorder(ui_central)
+    orchestrator = central.CentralOrchestrator(config, links)
+    loop = asyncio.new_event_loop()
+    start_thread(loop.run_until_complete, orchestrator.run(), name="central")
+
+    client_id = config['mic']['client_id']
+    if args.transport == "tcp":
+        transcriber = mic.TranscriberLink("127.0.0.1", config['ports']['transcriber']['mic_port'], client_id,
+                                          config['mic']['codec'], config['mic']['opus_bitrate'], True,
+                                          config['streaming']['enabled'])
+    else:
+        mic_audio, transcriber_mic = local_link()
+        start_thread(pipeline.ingest_local_mic, client_id, transcriber_mic, name="mic-ingest")
+        transcriber = mic.LocalTranscriberLink(mic_audio)
+    mic_status, speaker_mic = local_link()
+    speaker.add_status_subscriber(speaker_mic, "replay mic", audio_queue, player)
+    speaker_status = mic.LocalSpeakerStatusMonitor(mic_status, client_id)
+
+    stream = ReplayStream(args.speed, args.noise)
+    start_thread(mic.run_mic, config, transcriber, speaker_status, stream, name="mic")
+    return stream, ui, speaker_status, player, orchestrator, loop
+
+def run_turn(name, audio, stream, ui, speaker_status, args):
+    """Says one fixture and waits until the assistant has answered it (or clearly won't)."""
+    mark = ui.mark()
+    stream.play(audio)
+    stream.wait_until_played()
+    started = time.monotonic()
+    transcription = ui.wait_for("user_transcription:", mark, args.turn_timeout)
+    answered = False
+    if transcription is not None and ui.wait_for("llm_status:THINKING", mark, 1.0):
+        answered = ui.wait_for("llm_status:IDLE", mark, args.turn_timeout) is not None
+    wait_until_quiet(speaker_status.idle, args.gap / args.speed)
+    return {"fixture": name,
+            "transcription": transcription.split(":", 1)[1] if transcription is not None else None,
+            "answered": answered,
+            "turn_seconds": time.monotonic() - started}
+
+def compare(report, baseline, tolerance):
+    """Prints the change of each compared stage against a baseline report. Returns the regressed stages."""
+    print(f"\n--- Against {baseline['commit']} ---")
+    changed = [key for key, value in report['settings'].items() if baseline['settings'].get(key) != value]
+    if changed:
+        print(f"[!] Settings differ from the baseline ({', '.join(changed)}); latencies may not be comparable.")
+    regressions = []
+    for stage in COMPARED_STAGES:
+        new, old = report['stages'].get(stage), baseline['stages'].get(stage)
+        if new is None or old is None:
+            continue
+        line = f"  {stage:<20}"
+        for q in ("p50", "p95"):
+            change = new[q] - old[q]
+            line += f"  {q} {old[q] * 1000:7.0f} -> {new[q] * 1000:7.0f}ms ({change * 1000:+.0f})"
+        # Ignore a few milliseconds of jitter on fast stages.
+        regressed = new['p50'] > old['p50'] * (1 + tolerance) and new['p50'] - old['p50'] > 0.02
+        if regressed:
+            regressions.append(stage)
+        print(("[!]" if regressed else "   ") + line)
+    return regressions
+
+def main():
+    config_path = os.path.join(PROJECT_DIR, "config.yaml")
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    parser = argparse.ArgumentParser(description="Replays WAV fixtures through the full pipeline and reports latency.")
+    parser.add_argument("fixtures", nargs="?", default=os.path.join(PROJECT_DIR, "testings", "fixtures"),
+                        help="Directory of WAV files, each one spoken turn (starting with a wake word unless --awake).")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Plays audio in and out this many times faster than real time.")
+    parser.add_argument("--transport", choices=("tcp", "local"), default="tcp",
+                        help="Mic to transcriber over TCP with the configured codec, or in-process.")
+    parser.add_argument("--awake", action="store_true",
+                        help="Treat every fixture as a command, for fixtures recorded without a wake word.")
+    parser.add_argument("--model", help="Whisper model to load instead of the configured one.")
+    parser.add_argument("--tokens-per-second", type=float, default=FakeOllamaHandler.tokens_per_second)
+    parser.add_argument("--latency", type=float, default=FakeOllamaHandler.first_token_latency,
+                        help="Seconds before the fake LLM produces its first token.")
+    parser.add_argument("--load-time", type=float, default=FakeOllamaHandler.load_time,
+                        help="Seconds the fake LLM takes to load a cold model.")
+    parser.add_argument("--no-stream", action="store_true", help="Ask the LLM for whole answers.")
+    parser.add_argument("--gap", type=float, default=1.0, help="Seconds of quiet between an answer and the next turn.")
+    parser.add_argument("--noise", type=float, default=0.003, help="Amplitude of the background noise between turns.")
+    parser.add_argument("--turn-timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="Report file (default testings/reports/replay_<commit>.json).")
+    parser.add_argument("--baseline", help="Report of an earlier run to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Relative p50 increase reported as a regression (exit status 1).")
+    args = parser.parse_args()
+
+    args.fixture_paths = sorted(glob.glob(os.path.join(args.fixtures, "*.wav")))
+    if not args.fixture_paths:
+        print(f"[!!!] No WAV fixtures found in {args.fixtures}. Record some, or synthesize them with "
+              f"testings/make_fixtures.py (--awake for fixtures without a wake word).")
+        sys.exit(1)
+    fixtures = [(os.path.basename(path), load_wav(path)) for path in args.fixture_paths]
+    audio_seconds = sum(len(audio) for _, audio in fixtures) / SAMPLE_RATE
+    commit = git_commit()
+    print(f"[*] Replaying {len(fixtures)} fixtures ({audio_seconds:.1f}s of audio) at {args.speed}x on {commit}")
+
+    FakeOllamaHandler.tokens_per_second = args.tokens_per_second
+    FakeOllamaHandler.first_token_latency = args.latency
+    FakeOllamaHandler.load_time = args.load_time
+    FakeOllamaHandler.log_message = lambda handler, format, *log_args: None
+    ollama = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllamaHandler)
+    start_thread(ollama.serve_forever, name="fake-ollama")
+
+    workdir = tempfile.mkdtemp(prefix="brian_replay_")
+    config = benchmark_config(config, args, workdir, ollama.server_port)
+    stream, ui, speaker_status, player, orchestrator, loop = start_pipeline(config, args)
+    # Let the mic calibrate on background noise before anyone speaks.
+    stream.wait_until_read(config['vad']['calibration_seconds'] + 1.0)
+
+    turns = []
+    started = time.monotonic()
+    for name, audio in fixtures:
+        if args.awake:
+            loop.call_soon_threadsafe(orchestrator.set_awake, config['mic']['client_id'], True)
+        turn = run_turn(name, audio, stream, ui, speaker_status, args)
+        print(f"[+] {name}: {'answered' if turn['answered'] else 'not answered'} | {turn['transcription']}")
+        turns.append(turn)
+    wall_seconds = time.monotonic() - started
+    ollama.shutdown()
+
+    stages = orchestrator.tracer.summary()
+    asr_seconds = stages['asr']['sum'] if 'asr' in stages else 0.0
+    report = {
+        "commit": commit,
+        "generated_at": time.time(),
+        "settings": {"fixtures": [name for name, _ in fixtures], "speed": args.speed, "transport": args.transport,
+                     "codec": config['mic']['codec'], "streaming": config['streaming']['enabled'],
+                     "asr_backend": config['models']['asr_backend'], "model": config['models']['whisper'],
+                     "llm_stream": not args.no_stream, "tokens_per_second": args.tokens_per_second,
+                     "first_token_latency": args.latency, "load_time": args.load_time},
+        "throughput": {"turns": len(turns), "answered": sum(turn['answered'] for turn in turns),
+                       "audio_seconds": audio_seconds, "spoken_seconds": player.played_seconds,
+                       "wall_seconds": wall_seconds, "turns_per_minute": len(turns) / wall_seconds * 60,
+                       "asr_real_time_factor": asr_seconds / audio_seconds},
+        "turns": turns,
+        "stages": stages,
+    }
+
+    print("\n--- Latency (ms) ---")
+    for stage, stats in stages.items():
+        print(f"  {stage:<20} n={stats['count']:<4} p50 {stats['p50'] * 1000:7.0f}  p95 {stats['p95'] * 1000:7.0f}"
+              f"  p99 {stats['p99'] * 1000:7.0f}")
+    throughput = report['throughput']
+    print(f"[*] {throughput['answered']}/{throughput['turns']} turns answered in {wall_seconds:.1f}s "
+          f"({throughput['turns_per_minute']:.1f} turns/min), ASR RTF {throughput['asr_real_time_factor']:.3f}")
+
+    output = args.output or os.path.join(PROJECT_DIR, "testings", "reports", f"replay_{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[+] Report written to {output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"[!] Slower than the baseline: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Per-utterance latency tracing, configured under 'tracing' in config.yaml.
+
+The mic gives every utterance a trace id when its VAD detects speech. The
+id travels with the utterance through every service, and each service adds
+the spans of its own stages as (start, end) wall-clock times:
+  endpointing  mic          - silence after the last word until the VAD ends the utterance
+  transfer     transcriber  - end of the utterance leaving the mic until it arrives
+  asr_queue    transcriber  - waiting for a decode worker
+  asr          transcriber  - the final decode
+  forward      central      - transcription leaving the transcriber until central has it
+  llm_first_token, llm
+               central      - until the first token, and until the whole answer
+  tts          speaker      - text received until its first sentence is rendered
+  playback     speaker      - first audio out until the last
+Spans from different machines are only comparable if their clocks are in
+sync (NTP).
+
+Central collects them in a TraceCollector. It also derives
+time_to_first_audio and end_to_end, both counted from the moment the user
+stopped speaking (the start of endpointing), and reports p50/p95/p99 of
+every stage as JSON or in the Prometheus text format. Recording a span is
+a dict update, so tracing can stay on.
+"""
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+QUANTILES = (0.5, 0.95, 0.99)
+STAGES = ("endpointing", "transfer", "asr_queue", "asr", "forward", "llm_first_token", "llm", "tts", "playback")
+WIDENED_STAGES = {"playback"}
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+def new_trace():
+    """Starts the trace of an utterance whose speech was just detected."""
+    return {"id": new_trace_id(), "spans": {}}
+
+def add_span(trace, stage, start, end=None):
+    """Records a stage of a trace dict; end defaults to now."""
+    trace["spans"][stage] = [start, time.time() if end is None else end]
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+class TraceCollector:
+    """
+    Keeps the spans of the most recent max_traces utterances. The speaker
+    reports every text of a streamed answer: playback is widened to cover all
+    of them, while tts keeps the first, which is what delays the first audio.
+    """
+    def __init__(self, tracing_config):
+        self.max_traces = tracing_config['max_traces']
+        self.json_file = tracing_config['json_file']
+        self.prometheus_file = tracing_config['prometheus_file']
+        self.traces = OrderedDict()
+        self.lock = threading.Lock()
+
+    def record(self, trace_id, spans):
+        """Merges spans ({stage: [start, end]}) into a trace."""
+        with self.lock:
+            trace = self.traces.get(trace_id)
+            if trace is None:
+                trace = self.traces[trace_id] = {}
+                while len(self.traces) > self.max_traces:
+                    self.traces.popitem(last=False)
+            for stage, (start, end) in spans.items():
+                if stage in trace:
+                    if stage not in WIDENED_STAGES:
+                        continue
+                    start, end = min(start, trace[stage][0]), max(end, trace[stage][1])
+                trace[stage] = [start, end]
+
+    def durations(self):
+        """Returns {stage: [seconds, ...]} over the kept traces, including the derived totals."""
+        durations = {stage: [] for stage in STAGES + ("time_to_first_audio", "end_to_end")}
+        with self.lock:
+            traces = [dict(spans) for spans in self.traces.values()]
+        for spans in traces:
+            for stage, (start, end) in spans.items():
+                durations.setdefault(stage, []).append(max(0.0, end - start))
+            if "endpointing" not in spans or "playback" not in spans:
+                continue # Only turns that were answered out loud
+            speech_end = spans["endpointing"][0]
+            durations["time_to_first_audio"].append(max(0.0, spans["playback"][0] - speech_end))
+            finished = max(end for _, end in spans.values())
+            durations["end_to_end"].append(max(0.0, finished - speech_end))
+        return durations
+
+    def summary(self):
+        """Returns {stage: {"count", "sum", "p50", "p95", "p99"}} for every stage seen so far."""
+        summary = {}
+        for stage, values in self.durations().items():
+            if not values:
+                continue
+            values.sort()
+            summary[stage] = {"count": len(values), "sum": sum(values)}
+            for q in QUANTILES:
+                summary[stage][f"p{round(q * 100)}"] = percentile(values, q)
+        return summary
+
+    def to_json(self):
+        return json.dumps({"generated_at": time.time(), "stages": self.summary()}, indent=2)
+
+    def to_prometheus(self):
+        lines = ["# HELP brian_latency_seconds Latency of each stage of an utterance, and of the whole turn.",
+                 "# TYPE brian_latency_seconds summary"]
+        for stage, stats in self.summary().items():
+            for q in QUANTILES:
+                lines.append(f'brian_latency_seconds{{stage="{stage}",quantile="{q}"}} {stats[f"p{round(q * 100)}"]:.6f}')
+            lines.append(f'brian_latency_seconds_sum{{stage="{stage}"}} {stats["sum"]:.6f}')
+            lines.append(f'brian_latency_seconds_count{{stage="{stage}"}} {stats["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        """Writes the JSON and Prometheus reports, each swapped in atomically."""
+        for path, text in ((self.json_file, self.to_json()), (self.prometheus_file, self.to_prometheus())):
+            if not path:
+                continue
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+
+    def describe(self):
+        summary = self.summary()
+        parts = [f"{stage} p50 {summary[stage]['p50'] * 1000:.0f}ms p95 {summary[stage]['p95'] * 1000:.0f}ms"
+                 for stage in ("asr", "llm_first_token", "time_to_first_audio", "end_to_end") if stage in summary]
+        return ", ".join(parts) or "no traces yet"
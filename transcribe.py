@@ -1,12 +1,24 @@
 #!/home/nischay/linenv311/bin/python
+import time
+# Cold-start times are measured from here.
+STARTED = time.monotonic()
 import socket
-import struct
+import threading
+import queue
 import numpy as np
-import torch
-import time
 import yaml
 import sys
-from whisper import load_model
+import json
+import re
+from asr_backends import load_asr_backend
+from audio_codecs import CodecError, choose_codec, load_codec
+from framing import FrameReader, FrameTooLarge, send_text
+from transport import SocketEndpoint
+from tracing import add_span
+
+SAMPLE_RATE = 16000
+# Ends an utterance in a stream of decoded audio, like the empty frame on the wire.
+END_OF_UTTERANCE = np.zeros(0, dtype=np.float32)
 
 def load_config():
     """Loads the main configuration file."""
@@ -17,41 +29,532 @@ def load_config():
         print("[!!!] CRITICAL: config.yaml not found.")
         sys.exit(1)
 
-def main():
-    config = load_config()
+class MeteredQueue(queue.Queue):
+    """A bounded queue that keeps track of its peak depth and dropped items."""
+    def __init__(self, name, maxsize):
+        super().__init__(maxsize)
+        self.name = name
+        self.peak = 0
+        self.dropped = 0
+
+    def _put(self, item):
+        # Called by Queue.put with the queue's mutex held.
+        super()._put(item)
+        self.peak = max(self.peak, self._qsize())
+
+    def put_or_drop(self, item):
+        """Queues an item without blocking. Returns False if it was dropped."""
+        try:
+            self.put_nowait(item)
+            return True
+        except queue.Full:
+            with self.mutex:
+                self.dropped += 1
+            return False
+
+    def describe(self):
+        return f"{self.name} {self.qsize()}/{self.maxsize} (peak {self.peak}, dropped {self.dropped})"
+
+class TranscriberPipeline:
+    """
+    Runs the transcriber as three stages joined by bounded queues: network
+    ingest (one per mic connection), decode workers running Whisper, and a
+    forwarder that owns the connection to the central service. A slow decode
+    only fills the decode queue; it never stops the mic socket from being
+    read or the forwarder from reconnecting to central.
+
+    With a keyword spotter (kws), utterances from mics that central reports as
+    sleeping are first checked by a tiny model and only reach the main model
+    when they contain a wake word. The spotter runs on its own worker, fed
+    by a queue, so ingest never waits for it.
+
+    `central` is the endpoint of a central service hosted in the same process
+    (monolith mode); without it the forwarder connects over TCP.
+
+    The models can be handed over later with set_models(), so mics can
+    connect while they load: their finals wait in the decode queue, and the
+    spotter is skipped until it is ready.
+    """
+    def __init__(self, config, asr=None, kws=None, central=None):
+        self.asr = asr
+        self.kws = kws
+        self.local_central = central
+        # Set once the models are loaded; the decode workers wait for it.
+        self.models_ready = threading.Event()
+        if asr is not None:
+            self.models_ready.set()
+        self.cold_start_seconds = None
+
+        # --- Load Configuration ---
+        try:
+            transcriber_ports = config['ports']['transcriber']
+            self.mic_host = transcriber_ports['mic_host']
+            self.mic_port = transcriber_ports['mic_port']
+            self.central_host = transcriber_ports['central_host']
+            self.central_port = transcriber_ports['central_port']
+
+            self.streaming_enabled = config['streaming']['enabled']
+            self.window_samples = int(config['streaming']['window_seconds'] * SAMPLE_RATE)
+            self.partial_interval_samples = int(config['streaming']['partial_interval_seconds'] * SAMPLE_RATE)
+
+            pipeline_config = config['transcriber']
+            self.decode_workers = pipeline_config['decode_workers']
+            self.max_batch_size = pipeline_config['max_batch_size']
+            self.max_batch_wait = pipeline_config['max_batch_wait_ms'] / 1000.0
+            self.metrics_interval = pipeline_config['metrics_interval_seconds']
+            self.decode_queue = MeteredQueue("decode", pipeline_config['decode_queue_size'])
+            self.forward_queue = MeteredQueue("forward", pipeline_config['forward_queue_size'])
+
+            kws_config = config['kws']
+            self.kws_window_samples = int(kws_config['window_seconds'] * SAMPLE_RATE)
+            self.kws_queue = MeteredQueue("kws", kws_config['queue_size'])
+            # Tiny models often misspell the wake word, so known misspellings count too.
+            self.kws_pattern = re.compile(
+                r"\b(?:" + "|".join(re.escape(word) for word in config['wake_words'] + kws_config['aliases']) + r")\b",
+                re.IGNORECASE)
+        except KeyError as e:
+            print(f"[!!!] CRITICAL: Missing configuration in config.yaml. Key not found: {e}")
+            sys.exit(1)
+
+        self.lock = threading.Lock()
+        self.next_utterance_ids = {}
+        # Mics central considers awake; kept up to date by its wake_state messages.
+        self.awake_sources = set()
+        self.stats = {"frames": 0, "batches": 0, "decoded": 0, "forwarded": 0, "kws_passed": 0, "kws_rejected": 0,
+                      "buffered": 0}
+
+    def set_models(self, asr, kws=None):
+        """Hands over the loaded models; finals buffered while they loaded start decoding."""
+        self.asr = asr
+        self.kws = kws
+        self.cold_start_seconds = time.monotonic() - STARTED
+        self.models_ready.set()
+        print(f"[+] Transcriber ready {self.cold_start_seconds:.1f}s after start "
+              f"({self.stats['buffered']} utterances were buffered while loading).")
+
+    def count(self, stat, amount=1):
+        with self.lock:
+            self.stats[stat] += amount
+
+    def new_utterance(self, source):
+        """
+        Creates the shared state of one utterance from a mic. Ingest marks it
+        closed once the final decode is queued, so queued partials for it can be
+        skipped. Utterance ids count up separately for every source.
+        """
+        with self.lock:
+            utterance_id = self.next_utterance_ids.get(source, 0)
+            self.next_utterance_ids[source] = utterance_id + 1
+        # kws: True once the utterance may reach Whisper, False if rejected, None while undecided.
+        return {"id": utterance_id, "source": source, "closed": False, "partial_seq": 0,
+                "last_partial_text": "", "partial_sent": False, "kws": None if self.needs_kws(source) else True,
+                "kws_queued": False, "trace": None}
+
+    def needs_kws(self, source):
+        with self.lock:
+            return self.kws is not None and source not in self.awake_sources
+
+    def spot_keyword(self, audio, source):
+        """Runs the tiny model on the audio and returns True if a wake word was heard."""
+        if not len(audio):
+            return False
+        try:
+            text = self.kws.transcribe(audio)
+        except Exception as e:
+            # When in doubt let the main model decide.
+            print(f"[!] Keyword spotter failed, passing the audio on: {e}")
+            return True
+        heard = bool(self.kws_pattern.search(text))
+        print(f"[*] Keyword spotter ({source}): '{text}' -> {'wake word' if heard else 'ignored'}")
+        return heard
+
+    def start(self):
+        """Starts the worker stages and accepts mic connections."""
+        self.start_workers()
+        self.serve_mics()
+
+    def start_workers(self):
+        for i in range(self.decode_workers):
+            threading.Thread(target=self.decode_worker, name=f"decode-{i}", daemon=True).start()
+        # A single spotter worker decides each utterance before its final is handled.
+        threading.Thread(target=self.kws_worker, name="kws", daemon=True).start()
+        threading.Thread(target=self.forward_worker, name="forwarder", daemon=True).start()
+        threading.Thread(target=self.report_metrics, name="metrics", daemon=True).start()
+
+    def serve_mics(self):
+        """Accepts mic connections over TCP, forever."""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            s.bind((self.mic_host, self.mic_port))
+            s.listen()
+            print(f"[*] Transcriber listening for mic on {self.mic_host}:{self.mic_port} "
+                  f"({time.monotonic() - STARTED:.1f}s after start)")
+
+            while True:
+                conn, addr = s.accept()
+                # Each mic gets its own ingest thread; they share the decode workers.
+                threading.Thread(target=self.ingest_mic_client, args=(conn, addr), daemon=True).start()
+
+    # --- Stage 1: Network Ingest ---
+
+    def ingest_mic_client(self, conn, addr):
+        """
+        Reads audio from a mic connection and queues decode jobs for it. The mic
+        introduces itself with a JSON hello frame carrying its client id, the
+        codecs it can send, whether it streams and whether it traces its
+        utterances; the reply names the codec the audio will use and agrees to
+        tracing. Each connection is read in the mic's own streaming mode; mics
+        that don't say use the configured one.
+        """
+        try:
+            with conn:
+                reader = FrameReader(conn)
+                hello = read_hello(reader)
+                if hello is None:
+                    print(f"[!] Mic client {addr} did not send a valid hello. Closing connection.")
+                    return
+                source, offered_codecs, traced, streaming = hello
+                if streaming is None:
+                    streaming = self.streaming_enabled
+                codec = load_codec(choose_codec(offered_codecs))
+                send_text(conn, json.dumps({"codec": codec.name, "trace": traced}))
+                print(f"[+] Mic client '{source}' connected from {addr} "
+                      f"({codec.name} audio, {'streaming' if streaming else 'whole utterances'})")
+                self.ingest_audio(source, decode_frames(reader, codec, traced, streaming), streaming)
+        except (ConnectionResetError, BrokenPipeError):
+            print(f"[-] Mic client {addr} disconnected.")
+        except (FrameTooLarge, CodecError) as e:
+            print(f"[!] Dropping mic client {addr}: {e}")
+        finally:
+            print(f"[-] Connection closed for mic client {addr}")
+
+    def ingest_local_mic(self, source, endpoint):
+        """Reads audio from a mic hosted in the same process; it arrives already decoded, with its traces."""
+        print(f"[+] Mic client '{source}' linked in-process.")
+        self.ingest_audio(source, endpoint, self.streaming_enabled)
+
+    def ingest_audio(self, source, frames, streaming):
+        """
+        Queues decode jobs for a mic's audio. frames yields (float32 chunk,
+        trace) pairs; for a streaming mic an empty chunk ends the utterance,
+        otherwise every chunk is a complete utterance. The mic's trace, if
+        any, comes with the chunk that completes an utterance.
+        """
+        utterance = None
+        try:
+            for audio, trace in frames:
+                self.count("frames")
+
+                if not streaming:
+                    if not len(audio): break
+                    print(f"[*] Received {len(audio) / SAMPLE_RATE:.1f}s of audio from '{source}'.")
+                    self.finish_utterance(self.new_utterance(source), [audio], trace)
+                    continue
+
+                if not len(audio):
+                    # End of utterance: decode everything we have for the final result.
+                    if utterance is not None:
+                        self.finish_utterance(utterance, chunks, trace)
+                        utterance = None
+                    continue
+
+                if utterance is None:
+                    utterance = self.new_utterance(source)
+                    chunks = []
+                    buffered_samples = 0
+                    last_partial_at = 0
+                chunks.append(audio)
+                buffered_samples += len(audio)
 
-    # --- Load Configuration ---
+                if utterance["kws"] is None:
+                    # No partials until the spotter has passed the utterance.
+                    if buffered_samples >= self.kws_window_samples and not utterance["kws_queued"]:
+                        utterance["kws_queued"] = True
+                        # If this is dropped, the spotter decides when the utterance ends.
+                        self.kws_queue.put_or_drop({"kind": "check", "utterance": utterance,
+                                                    "audio": np.concatenate(chunks)[:self.kws_window_samples]})
+                    continue
+
+                if buffered_samples - last_partial_at >= self.partial_interval_samples:
+                    last_partial_at = buffered_samples
+                    self.queue_partial(utterance, np.concatenate(chunks)[-self.window_samples:])
+        finally:
+            # Don't leave an utterance without a final; the forwarder waits for it.
+            if utterance is not None:
+                self.finish_utterance(utterance, chunks)
+
+    def finish_utterance(self, utterance, chunks, trace=None):
+        """
+        Queues the final decode, or hands the utterance to the spotter if it is
+        still undecided. A rejected one still gets an empty final to keep
+        ordering.
+        """
+        if trace and "id" in trace:
+            add_span(trace, "transfer", trace.pop("sent", time.time()))
+            utterance["trace"] = trace
+        if utterance["kws"] is None:
+            # Not dropped: the utterance's final depends on it (backpressure, like the decode queue).
+            self.kws_queue.put({"kind": "final", "utterance": utterance, "chunks": chunks})
+        else:
+            self.queue_final(utterance, chunks if utterance["kws"] else [])
+
+    def kws_worker(self):
+        """
+        Runs the keyword spotter for the ingest threads. A check of the first
+        window can pass an utterance early, so partials can start, but never
+        rejects it: the wake word may come last ("What time is it, Brian?").
+        A final decides a still undecided utterance from all of its audio,
+        then queues its final decode. Jobs are handled in order, so a final
+        always comes after its check.
+        """
+        while True:
+            job = self.kws_queue.get()
+            utterance = job["utterance"]
+            if job["kind"] == "check":
+                if utterance["kws"] is None and self.spot_keyword(job["audio"], utterance["source"]):
+                    utterance["kws"] = True
+                    self.count("kws_passed")
+                continue
+            chunks = job["chunks"]
+            if utterance["kws"] is None:
+                utterance["kws"] = bool(chunks) and self.spot_keyword(np.concatenate(chunks), utterance["source"])
+                self.count("kws_passed" if utterance["kws"] else "kws_rejected")
+            self.queue_final(utterance, chunks if utterance["kws"] else [])
+
+    def queue_partial(self, utterance, window):
+        """Partials are best-effort: when decoding falls behind they are dropped."""
+        if not self.models_ready.is_set():
+            return # The final would be decoded before it anyway.
+        utterance["partial_seq"] += 1
+        job = {"kind": "partial", "utterance": utterance, "seq": utterance["partial_seq"], "audio": window}
+        self.decode_queue.put_or_drop(job)
+
+    def queue_final(self, utterance, chunks):
+        """Finals are never dropped; a full decode queue blocks ingest (backpressure)."""
+        utterance["closed"] = True
+        if not self.models_ready.is_set():
+            self.count("buffered")
+        audio = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+        self.decode_queue.put({"kind": "final", "utterance": utterance, "audio": audio, "queued": time.time()})
+
+    # --- Stage 2: Decode ---
+
+    def is_stale(self, job):
+        """A partial is stale once its utterance is closed or a newer partial is queued."""
+        utterance = job["utterance"]
+        return job["kind"] == "partial" and (utterance["closed"] or job["seq"] != utterance["partial_seq"])
+
+    def next_batch(self):
+        """
+        Blocks for the first job, then keeps collecting jobs from any mic until
+        the batch is full or max_batch_wait has passed since the first one.
+        """
+        batch = []
+        deadline = None
+        while len(batch) < self.max_batch_size:
+            try:
+                if deadline is None:
+                    job = self.decode_queue.get()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    job = self.decode_queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if self.is_stale(job):
+                continue
+            batch.append(job)
+            if deadline is None:
+                deadline = time.monotonic() + self.max_batch_wait
+        return batch
+
+    def decode_worker(self):
+        """Runs Whisper on batches of queued jobs."""
+        self.models_ready.wait()
+        while True:
+            batch = self.next_batch()
+            decodable = [job for job in batch if len(job["audio"])]
+
+            texts = {}
+            if decodable:
+                started = time.time()
+                try:
+                    results = self.asr.transcribe_batch([job["audio"] for job in decodable])
+                    texts = {id(job): text for job, text in zip(decodable, results)}
+                    self.count("batches")
+                    self.count("decoded", len(decodable))
+                except Exception as e:
+                    print(f"[!] Whisper failed to decode a batch of {len(decodable)}: {e}")
+                for job in decodable:
+                    trace = job["utterance"]["trace"]
+                    if job["kind"] == "final" and trace is not None:
+                        add_span(trace, "asr_queue", job["queued"], started)
+                        add_span(trace, "asr", started)
+
+            for job in batch:
+                text = texts.get(id(job), "")
+                # Every final must reach the forwarder, even an empty one, to keep ordering.
+                if text or job["kind"] == "final":
+                    self.forward_queue.put({"kind": job["kind"], "utterance": job["utterance"], "text": text})
+
+    # --- Stage 3: Forward ---
+
+    def forward_worker(self):
+        """
+        Sends results to central in utterance order for each mic. Finals that
+        finish early on another decode worker are held until the finals before
+        them from the same mic are sent.
+        """
+        central = self.connect_central()
+        pending_finals = {}
+        next_final_ids = {}
+        while True:
+            result = self.forward_queue.get()
+            utterance = result["utterance"]
+
+            if result["kind"] == "partial":
+                if utterance["closed"] or result["text"] == utterance["last_partial_text"]:
+                    continue
+                utterance["last_partial_text"] = result["text"]
+                utterance["partial_sent"] = True
+                print(f"[*] Partial ({utterance['source']}): {result['text']}")
+                central = self.send_to_central(central, "partial", result["text"], utterance["source"])
+                continue
+
+            source = utterance["source"]
+            pending = pending_finals.setdefault(source, {})
+            pending[utterance["id"]] = result
+            while next_final_ids.get(source, 0) in pending:
+                final = pending.pop(next_final_ids.get(source, 0))
+                next_final_ids[source] = final["utterance"]["id"] + 1
+                # A final is always sent after partials so the UI can clear them.
+                if final["text"] or final["utterance"]["partial_sent"]:
+                    print(f"📝 Transcription ({source}): {final['text']}")
+                    central = self.send_to_central(central, "final", final["text"], source, final["utterance"]["trace"])
+
+    def send_to_central(self, central, kind, text, source, trace=None):
+        """Sends a partial or final transcription to central, reconnecting if needed."""
+        message = {"type": kind, "text": text, "source": source}
+        if trace is not None:
+            message["trace"] = dict(trace, sent=time.time())
+        message = json.dumps(message)
+        try:
+            central.send(message)
+        except (socket.error, BrokenPipeError):
+            print("[!] Central service disconnected. Reconnecting...")
+            central.close()
+            central = self.connect_central()
+            central.send(message)
+        self.count("forwarded")
+        return central
+
+    def connect_central(self):
+        """Connects to central and starts listening for the wake states it pushes back."""
+        if self.local_central is not None:
+            central = self.local_central
+        else:
+            central = SocketEndpoint(connect_to_central(self.central_host, self.central_port))
+        with self.lock:
+            # Central resends the current wake states on every new connection.
+            self.awake_sources.clear()
+        threading.Thread(target=self.listen_to_central, args=(central,), name="central-listener", daemon=True).start()
+        return central
+
+    def listen_to_central(self, central):
+        """Tracks which mics are awake from central's wake_state messages."""
+        try:
+            for data in central:
+                try:
+                    message = json.loads(data)
+                except json.JSONDecodeError:
+                    continue
+                if message.get("type") == "wake_state":
+                    with self.lock:
+                        if message["awake"]:
+                            self.awake_sources.add(message["source"])
+                        else:
+                            self.awake_sources.discard(message["source"])
+        except (OSError, FrameTooLarge):
+            pass # The forwarder notices the broken connection and reconnects.
+
+    def report_metrics(self):
+        """Periodically logs queue depths and stage throughput."""
+        while True:
+            time.sleep(self.metrics_interval)
+            with self.lock:
+                stats = dict(self.stats)
+            average_batch = stats['decoded'] / stats['batches'] if stats['batches'] else 0.0
+            cold_start = f"{self.cold_start_seconds:.1f}s" if self.cold_start_seconds is not None else "loading"
+            print(f"[*] Pipeline: cold start {cold_start}, frames={stats['frames']} decoded={stats['decoded']} "
+                  f"(avg batch {average_batch:.1f}) forwarded={stats['forwarded']} "
+                  f"kws={stats['kws_passed']} passed/{stats['kws_rejected']} rejected | "
+                  f"{self.kws_queue.describe()} | {self.decode_queue.describe()} | {self.forward_queue.describe()}")
+
+def load_models(config):
+    """Loads the ASR backend and, if enabled, the keyword spotter. Exits if either fails."""
     try:
         model_name = config['models']['whisper']
-        transcriber_config = config['ports']['transcriber']
-        mic_host = transcriber_config['mic_host']
-        mic_port = transcriber_config['mic_port']
-        central_host = transcriber_config['central_host']
-        central_port = transcriber_config['central_port']
+        backend_name = config['models']['asr_backend']
+        asr_config = config['models']['asr']
+        kws_config = config['kws']
     except KeyError as e:
         print(f"[!!!] CRITICAL: Missing configuration in config.yaml. Key not found: {e}")
         sys.exit(1)
 
-    # --- Whisper Model Initialization ---
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    print(f"[*] Using device: {device}")
-    model = load_model(model_name, device=device)
-    print(f"[+] Whisper model '{model_name}' loaded.")
+    # --- ASR Model Initialization ---
+    print(f"[*] Loading '{model_name}' with the {backend_name} backend...")
+    started = time.monotonic()
+    try:
+        asr = load_asr_backend(backend_name, model_name, asr_config)
+    except (ValueError, ImportError, KeyError) as e:
+        print(f"[!!!] CRITICAL: Could not load the ASR backend: {e}")
+        sys.exit(1)
+    print(f"[+] Model '{model_name}' loaded on {asr.device} ({backend_name}) in {time.monotonic() - started:.1f}s.")
+
+    kws = None
+    if kws_config['enabled']:
+        print(f"[*] Loading keyword spotter '{kws_config['model']}'...")
+        try:
+            kws = load_asr_backend(backend_name, kws_config['model'], asr_config)
+        except (ValueError, ImportError, KeyError) as e:
+            print(f"[!!!] CRITICAL: Could not load the keyword spotter: {e}")
+            sys.exit(1)
+    return asr, kws
+
+def main():
+    config = load_config()
+    pipeline = TranscriberPipeline(config)
 
     # --- Main Server Loop ---
-    central_sock = connect_to_central(central_host, central_port)
-    
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.bind((mic_host, mic_port))
-        s.listen()
-        print(f"[*] Transcriber listening for mic on {mic_host}:{mic_port}")
-        
-        while True:
-            conn, addr = s.accept()
-            # Since we only expect one mic, we handle it in the main thread.
-            # For multiple mics, a new thread would be needed here.
-            central_sock = handle_mic_client(conn, addr, model, central_sock, central_host, central_port, device)
+    # Mics can connect right away; the models (and torch) load while they wait.
+    pipeline.start_workers()
+    server = threading.Thread(target=pipeline.serve_mics, name="mic-server", daemon=True)
+    server.start()
+    pipeline.set_models(*load_models(config))
+    server.join()
+
+def decode_frames(reader, codec, traced, streaming):
+    """
+    Yields (float32 samples, trace) for a mic connection's frames until it
+    closes. A traced mic follows the frame that completes an utterance (the
+    empty frame when streaming, otherwise the audio) with its trace as JSON;
+    trace is None for every other frame.
+    """
+    while True:
+        data = reader.read_frame()
+        if data is None:
+            return
+        audio = codec.decode(data) if data else END_OF_UTTERANCE
+        trace = None
+        completes_utterance = not data if streaming else bool(data)
+        if traced and completes_utterance:
+            text = reader.read_text()
+            try:
+                trace = json.loads(text) if text else None
+            except json.JSONDecodeError:
+                pass
+        yield audio, trace
 
 def connect_to_central(host, port):
     """Connects to the central service with retries."""
@@ -66,53 +569,22 @@ def connect_to_central(host, port):
             print(f"[!] Connection to central failed: {e}. Retrying in 5s...")
             time.sleep(5)
 
-def handle_mic_client(conn, addr, model, central_sock, central_host, central_port, device):
-    """Handles a connection from the mic, transcribes, and forwards."""
-    print(f"[+] Mic client connected from {addr}")
-    try:
-        with conn:
-            while True:
-                length_bytes = conn.recv(4)
-                if not length_bytes: break
-                
-                length = struct.unpack('>I', length_bytes)[0]
-                data = b""
-                while len(data) < length:
-                    packet = conn.recv(length - len(data))
-                    if not packet: break
-                    data += packet
-                
-                if not data: break
-                
-                print(f"[*] Received {len(data)} bytes of audio data.")
-                
-                audio_np = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
-                result = model.transcribe(audio_np, language="en", fp16=(device=="cuda"))
-                text = result['text'].strip()
-
-                if text:
-                    print(f"📝 Transcription: {text}")
-                    central_sock = send_to_central(central_sock, text, central_host, central_port)
-
-    except (ConnectionResetError, BrokenPipeError):
-        print(f"[-] Mic client {addr} disconnected.")
-    finally:
-        print(f"[-] Connection closed for mic client {addr}")
-    return central_sock
-
-def send_to_central(sock, text, host, port):
-    """Sends the transcribed text to the central service."""
+def read_hello(reader):
+    """
+    Reads the mic's hello frame and returns (client id, offered codecs,
+    traced, streaming), or None if invalid. Mics that offer no codecs send raw
+    PCM; streaming is None for mics that don't say.
+    """
+    data = reader.read_text()
+    if data is None:
+        return None
     try:
-        encoded_text = text.encode('utf-8')
-        length = struct.pack('>I', len(encoded_text))
-        sock.sendall(length)
-        sock.sendall(encoded_text)
-        return sock
-    except (socket.error, BrokenPipeError):
-        print("[!] Central service disconnected. Reconnecting...")
-        sock.close()
-        return connect_to_central(host, port)
+        hello = json.loads(data)
+        streaming = hello.get("streaming")
+        return (str(hello["client_id"]), list(hello.get("codecs", ["pcm16"])), bool(hello.get("trace", False)),
+                None if streaming is None else bool(streaming))
+    except (ValueError, KeyError, TypeError):
+        return None
 
 if __name__ == "__main__":
     main()
-
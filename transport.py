@@ -0,0 +1,81 @@
+"""
+Links between the B.R.I.A.N. services.
+
+Run as separate programs, every link is a TCP connection carrying
+length-prefixed frames (framing.py). monolith.py hosts the services in one
+process instead and joins them with in-memory links, which hand messages
+over by reference: no framing, no copies, no system calls. Audio from an
+in-process mic reaches the transcriber as the float32 array it was
+converted to, not as encoded bytes.
+
+Both kinds of endpoint have the same blocking interface, so a service
+doesn't need to know which one it was given:
+  send(message) - passes a message to the other side
+  receive()     - returns the next message, or None once the link is closed
+  close()       - closes the link; iterating an endpoint calls receive() until then
+Socket endpoints carry text. Local endpoints carry any object, but the
+services send them the same strings they would send over TCP, so only
+audio changes form between the two modes.
+"""
+import queue
+import select
+from framing import FrameReader, send_text
+
+class SocketEndpoint:
+    """A framed TCP connection."""
+    def __init__(self, sock):
+        self.sock = sock
+        self.reader = FrameReader(sock)
+
+    def send(self, text):
+        send_text(self.sock, text)
+
+    def receive(self):
+        if self.sock.gettimeout() is not None:
+            # The timeout is meant for sends; wait for data so an idle peer isn't an error.
+            select.select([self.sock], [], [])
+        return self.reader.read_text()
+
+    def __iter__(self):
+        while True:
+            message = self.receive()
+            if message is None:
+                return
+            yield message
+
+    def close(self):
+        self.sock.close()
+
+# Put on a queue by close(); never seen by the services.
+_CLOSED = object()
+
+class LocalEndpoint:
+    """One side of an in-memory link: reads its inbox and writes the other side's."""
+    def __init__(self, inbox, outbox):
+        self.inbox = inbox
+        self.outbox = outbox
+
+    def send(self, message):
+        self.outbox.put(message)
+
+    def receive(self):
+        message = self.inbox.get()
+        if message is _CLOSED:
+            self.inbox.put(_CLOSED) # Stay closed for later calls.
+            return None
+        return message
+
+    def __iter__(self):
+        while True:
+            message = self.receive()
+            if message is None:
+                return
+            yield message
+
+    def close(self):
+        self.outbox.put(_CLOSED)
+
+def local_link():
+    """Returns the two connected endpoints of a new in-memory link."""
+    forward, backward = queue.Queue(), queue.Queue()
+    return LocalEndpoint(backward, forward), LocalEndpoint(forward, backward)
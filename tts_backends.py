@@ -0,0 +1,132 @@
+"""
+Text-to-speech backends used by the speaker. The backend is chosen with
+tts.backend in config.yaml and tuned in the section of the same name.
+
+Every backend renders text to audio instead of playing it, so the speaker
+can cache and play the result itself:
+  synthesize(text) -> (int16 mono samples, sample rate)
+`voice` and `rate` describe the configured voice; together with the text
+they key the audio cache. Libraries are imported when the backend is
+created, so only the selected engine has to be installed.
+"""
+import io
+import os
+import tempfile
+import time
+import numpy as np
+
+def to_int16(samples):
+    """Converts float samples in [-1, 1] to int16."""
+    return (np.clip(np.asarray(samples, dtype=np.float32), -1.0, 1.0) * 32767).astype(np.int16)
+
+class Pyttsx3Backend:
+    """The operating system's voices through pyttsx3, rendered to a temporary file."""
+    name = "pyttsx3"
+
+    def __init__(self, tts_config):
+        import pyttsx3
+        import soundfile
+        self.soundfile = soundfile
+        self.engine = pyttsx3.init()
+
+        settings = tts_config['pyttsx3']
+        self.rate = settings['rate']
+        voice_index = settings['voice_index']
+        self.engine.setProperty('rate', self.rate)
+
+        voices = self.engine.getProperty('voices')
+        if 0 <= voice_index < len(voices):
+            self.engine.setProperty('voice', voices[voice_index].id)
+            self.voice = voices[voice_index].id
+            print(f"[*] TTS engine initialized with voice: {voices[voice_index].name} (Rate: {self.rate})")
+        else:
+            self.voice = "default"
+            print(f"[!] Warning: Voice index {voice_index} is out of range. Using default voice.")
+
+    def synthesize(self, text):
+        # Some drivers pick the file format from the extension, others always write WAV or AIFF;
+        # libsndfile reads both.
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            self.engine.save_to_file(text, path)
+            self.engine.runAndWait()
+            samples, sample_rate = self.soundfile.read(path, dtype='int16')
+        finally:
+            os.remove(path)
+        if samples.ndim > 1:
+            samples = samples[:, 0]
+        return samples, sample_rate
+
+class CoquiBackend:
+    """
+    Offline neural TTS with Coqui TTS. The default VITS model runs faster
+    than real time on a CPU and sounds far more natural than the system voices.
+    """
+    name = "coqui"
+
+    def __init__(self, tts_config):
+        from TTS.api import TTS
+
+        settings = tts_config['coqui']
+        self.tts = TTS(settings['model'], progress_bar=False).to(settings['device'])
+        self.voice = f"{settings['model']}:{settings['speaker'] or 'default'}"
+        self.speaker = settings['speaker'] or None
+        self.rate = settings['speed']
+        self.sample_rate = self.tts.synthesizer.output_sample_rate
+        print(f"[*] Coqui TTS model '{settings['model']}' loaded on {settings['device']}.")
+
+    def synthesize(self, text):
+        samples = self.tts.tts(text, speaker=self.speaker, speed=self.rate)
+        return to_int16(samples), self.sample_rate
+
+class GTTSBackend:
+    """Google Translate's voices through gTTS. Needs internet access and a libsndfile that reads MP3."""
+    name = "gtts"
+
+    def __init__(self, tts_config):
+        from gtts import gTTS
+        import soundfile
+        self.gTTS = gTTS
+        self.soundfile = soundfile
+
+        settings = tts_config['gtts']
+        self.lang = settings['lang']
+        self.tld = settings['tld']
+        self.slow = settings['slow']
+        self.voice = f"{self.lang}-{self.tld}"
+        self.rate = "slow" if self.slow else "normal"
+
+    def synthesize(self, text):
+        mp3 = io.BytesIO()
+        self.gTTS(text, lang=self.lang, tld=self.tld, slow=self.slow).write_to_fp(mp3)
+        mp3.seek(0)
+        return self.soundfile.read(mp3, dtype='int16')
+
+class SilentBackend:
+    """
+    Silence as long as the text would take to say, for benchmarks without a
+    sound card or TTS engine. Rendering takes real_time_factor times the
+    spoken duration, like an engine of that speed would.
+    """
+    name = "silent"
+
+    def __init__(self, tts_config):
+        settings = tts_config['silent']
+        self.rate = settings['words_per_minute']
+        self.sample_rate = settings['sample_rate']
+        self.real_time_factor = settings['real_time_factor']
+        self.voice = "silence"
+
+    def synthesize(self, text):
+        seconds = len(text.split()) * 60.0 / self.rate
+        time.sleep(seconds * self.real_time_factor)
+        return np.zeros(int(seconds * self.sample_rate), dtype=np.int16), self.sample_rate
+
+BACKENDS = {backend.name: backend for backend in (Pyttsx3Backend, CoquiBackend, GTTSBackend, SilentBackend)}
+
+def load_tts_backend(backend_name, tts_config):
+    """Creates the configured backend. Raises ValueError for an unknown name."""
+    if backend_name not in BACKENDS:
+        raise ValueError(f"Unknown TTS backend '{backend_name}'. Choose one of: {', '.join(BACKENDS)}")
+    return BACKENDS[backend_name](tts_config)
@@ -0,0 +1,100 @@
+"""
+On-disk cache of synthesized speech for the speaker, configured under
+tts.cache in config.yaml.
+
+Each clip is a WAV file named after a hash of (backend, voice, rate, text),
+so changing the voice or speed never plays stale audio. The files' mtimes
+record when they were last played; once the directory grows beyond
+max_mb, the least recently played clips are deleted.
+"""
+import hashlib
+import os
+import threading
+import time
+import wave
+import numpy as np
+
+class TTSCache:
+    def __init__(self, cache_config):
+        self.directory = cache_config['directory']
+        self.max_bytes = cache_config['max_mb'] * 1024 * 1024
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        # key -> (size in bytes, last used)
+        self.index = {}
+        for name in os.listdir(self.directory):
+            if name.endswith(".wav"):
+                stat = os.stat(os.path.join(self.directory, name))
+                self.index[name[:-4]] = (stat.st_size, stat.st_mtime)
+        self.total_bytes = sum(size for size, _ in self.index.values())
+
+    @staticmethod
+    def key(backend, text):
+        identity = f"{backend.name}\n{backend.voice}\n{backend.rate}\n{text}"
+        return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.wav")
+
+    def get(self, backend, text):
+        """Returns (samples, sample rate) for text spoken by backend, or None."""
+        key = self.key(backend, text)
+        with self.lock:
+            if key not in self.index:
+                self.misses += 1
+                return None
+            try:
+                with wave.open(self.path(key), "rb") as wav:
+                    sample_rate = wav.getframerate()
+                    samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+                now = time.time()
+                os.utime(self.path(key), (now, now))
+            except (OSError, wave.Error, EOFError):
+                # Deleted or damaged behind our back; synthesize it again.
+                self._remove(key)
+                self.misses += 1
+                return None
+            self.index[key] = (self.index[key][0], now)
+            self.hits += 1
+        return samples, sample_rate
+
+    def put(self, backend, text, samples, sample_rate):
+        key = self.key(backend, text)
+        tmp_path = self.path(key) + ".tmp"
+        with wave.open(tmp_path, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+            wav.writeframes(np.ascontiguousarray(samples, dtype=np.int16).tobytes())
+        os.replace(tmp_path, self.path(key))
+
+        with self.lock:
+            if key in self.index:
+                self.total_bytes -= self.index[key][0]
+            size = os.path.getsize(self.path(key))
+            self.index[key] = (size, time.time())
+            self.total_bytes += size
+            self._evict()
+
+    def _evict(self):
+        """Deletes the least recently played clips until the cache fits. Caller holds the lock."""
+        if self.total_bytes <= self.max_bytes:
+            return
+        for key, _ in sorted(self.index.items(), key=lambda item: item[1][1]):
+            if self.total_bytes <= self.max_bytes:
+                break
+            self._remove(key)
+
+    def _remove(self, key):
+        size, _ = self.index.pop(key, (0, 0))
+        self.total_bytes -= size
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def describe(self):
+        return f"{self.hits} hits, {self.misses} misses, {len(self.index)} clips ({self.total_bytes / 1024 / 1024:.1f} MB)"
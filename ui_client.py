@@ -1,12 +1,13 @@
 #!/home/nischay/linenv311/bin/python
 import socket
-import struct
 import tkinter as tk
 from tkinter import scrolledtext, font as tkfont
 import threading
 import queue
 import yaml
 import sys
+from framing import FrameTooLarge
+from transport import SocketEndpoint
 
 def load_config():
     """Loads the main configuration file."""
@@ -18,17 +19,21 @@ def load_config():
         sys.exit(1)
 
 class AssistantUI:
-    def __init__(self, root):
+    def __init__(self, root, ui_config):
         self.root = root
         self.root.title("B.R.I.A.N. - Control Panel")
         self.root.geometry("800x600")
         self.root.configure(bg="#1e1e1e")
         self.message_queue = queue.Queue()
+        self.response_in_progress = False
+        self.refresh_ms = ui_config['refresh_ms']
+        self.max_messages_per_tick = ui_config['max_messages_per_tick']
+        self.max_transcript_lines = ui_config['max_transcript_lines']
 
         self._setup_fonts()
         self._setup_ui()
         
-        self.root.after(100, self.process_queue)
+        self.root.after(self.refresh_ms, self.process_queue)
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
 
     def _setup_fonts(self):
@@ -56,75 +61,115 @@ class AssistantUI:
         self.llm_status.pack(side=tk.LEFT)
         self.update_status(self.llm_status, "LLM", "IDLE", "#a0a0a0")
 
+        # Live line showing what the user is saying while they are still talking.
+        self.partial_label = tk.Label(self.root, text="", font=self.default_font, bg="#1e1e1e", fg="#808080",
+                                      anchor=tk.W, justify=tk.LEFT)
+        self.partial_label.pack(side=tk.BOTTOM, fill=tk.X, padx=10)
+        self.partial_label.bind("<Configure>", lambda e: self.partial_label.config(wraplength=e.width))
+
     def update_status(self, label, prefix, text, color):
         label.config(text=f"{prefix}: {text}", fg=color)
 
-    def update_text_area(self, user, message):
+    def update_partial_text(self, text):
+        self.partial_label.config(text=f"You: {text}..." if text else "")
+
+    def insert_text(self, text):
+        """Inserts text in a single widget operation and trims the oldest lines."""
         self.text_area.config(state='normal')
-        self.text_area.insert(tk.END, f"{user}: {message}\n\n")
+        self.text_area.insert(tk.END, text)
+        # Keep Tk fast in long sessions by bounding the transcript.
+        line_count = int(self.text_area.index('end-1c').split('.')[0])
+        if line_count > self.max_transcript_lines:
+            self.text_area.delete('1.0', f"{line_count - self.max_transcript_lines + 1}.0")
         self.text_area.config(state='disabled')
         self.text_area.yview(tk.END)
 
+    def format_entry(self, user, message):
+        # A full entry arriving mid-stream closes the streamed answer first.
+        prefix = self.format_response_end()
+        return f"{prefix}{user}: {message}\n\n"
+
+    def format_response_chunk(self, chunk):
+        """Formats a streamed piece of the assistant's answer for the current entry."""
+        if not self.response_in_progress:
+            self.response_in_progress = True
+            chunk = f"Assistant: {chunk}"
+        return chunk
+
+    def format_response_end(self):
+        if self.response_in_progress:
+            self.response_in_progress = False
+            return "\n\n"
+        return ""
+
     def process_queue(self):
+        """
+        Drains every pending message (up to max_messages_per_tick) once per tick.
+        Only the latest wake/LLM status and partial transcription are drawn, and
+        all transcript text is inserted with a single widget operation.
+        """
+        wake_status = llm_status = partial = None
+        pieces = []
         try:
-            message = self.message_queue.get_nowait()
-            print(f"[UI DEBUG] Processing message from queue: '{message}'") # Debug line added
-            parts = message.split(':', 1)
-            msg_type = parts[0]
-            content = parts[1] if len(parts) > 1 else ""
-
-            if msg_type == "wake_status":
-                color = "#7be08a" if content == "LISTENING" else "#e07b7b"
-                self.update_status(self.wake_status, "WAKE", content, color)
-            elif msg_type == "llm_status":
-                colors = {"IDLE": "#a0a0a0", "THINKING": "#e0d37b", "SPEAKING": "#7bcee0"}
-                self.update_status(self.llm_status, "LLM", content, colors.get(content, "#a0a0a0"))
-            elif msg_type == "user_transcription":
-                self.update_text_area("You", content)
-            elif msg_type == "llm_response":
-                self.update_text_area("Assistant", content)
-            elif msg_type == "system_message":
-                self.update_text_area("System", content)
-
+            for _ in range(self.max_messages_per_tick):
+                message = self.message_queue.get_nowait()
+                parts = message.split(':', 1)
+                msg_type = parts[0]
+                content = parts[1] if len(parts) > 1 else ""
+
+                if msg_type == "wake_status":
+                    wake_status = content
+                elif msg_type == "llm_status":
+                    llm_status = content
+                elif msg_type == "partial_transcription":
+                    partial = content
+                elif msg_type == "user_transcription":
+                    partial = ""
+                    pieces.append(self.format_entry("You", content))
+                elif msg_type == "llm_response":
+                    pieces.append(self.format_entry("Assistant", content))
+                elif msg_type == "llm_response_chunk":
+                    pieces.append(self.format_response_chunk(content))
+                elif msg_type == "llm_response_end":
+                    pieces.append(self.format_response_end())
+                elif msg_type == "system_message":
+                    pieces.append(self.format_entry("System", content))
         except queue.Empty:
             pass
         finally:
-            self.root.after(100, self.process_queue)
+            if wake_status is not None:
+                color = "#7be08a" if wake_status == "LISTENING" else "#e07b7b"
+                self.update_status(self.wake_status, "WAKE", wake_status, color)
+            if llm_status is not None:
+                colors = {"IDLE": "#a0a0a0", "THINKING": "#e0d37b", "SPEAKING": "#7bcee0"}
+                self.update_status(self.llm_status, "LLM", llm_status, colors.get(llm_status, "#a0a0a0"))
+            if partial is not None:
+                self.update_partial_text(partial)
+            text = "".join(pieces)
+            if text:
+                self.insert_text(text)
+            self.root.after(self.refresh_ms, self.process_queue)
     
     def on_closing(self):
         self.root.destroy()
 
+def relay_messages(endpoint, msg_queue):
+    """Puts every message central sends into the queue for the GUI thread until its link closes."""
+    for message in endpoint:
+        msg_queue.put(message)
+    print("[-] Central service closed the connection.")
+
 def handle_central_client(conn, msg_queue):
     """Handles the connection from the central service, receiving all UI updates."""
     print("[+] Central service connected to UI.")
     try:
         with conn:
-            while True:
-                # 1. Read the 4-byte length prefix to determine message size
-                length_bytes = conn.recv(4)
-                if not length_bytes:
-                    print("[-] Central service closed the connection (no length).")
-                    break
-                length = struct.unpack('>I', length_bytes)[0]
-                
-                # 2. Loop to ensure the full message is received
-                data = b""
-                while len(data) < length:
-                    packet = conn.recv(length - len(data))
-                    if not packet:
-                        print("[-] Central service closed the connection (incomplete data).")
-                        break
-                    data += packet
-                
-                # This outer break is necessary if the inner loop breaks
-                if len(data) < length:
-                    break
-
-                # 3. Put the complete message into the queue for the GUI thread
-                msg_queue.put(data.decode('utf-8'))
+            relay_messages(SocketEndpoint(conn), msg_queue)
 
     except (ConnectionResetError, BrokenPipeError):
         print("[-] Central service disconnected from UI.")
+    except FrameTooLarge as e:
+        print(f"[!] Dropping central service connection: {e}")
     finally:
         print("[*] UI client handler finished.")
 
@@ -150,12 +195,13 @@ def main():
     try:
         host = config['ports']['ui']['host']
         port = config['ports']['ui']['port']
+        ui_config = config['ui']
     except KeyError as e:
         print(f"[!!!] CRITICAL: Missing configuration in config.yaml. Key not found: {e}")
         sys.exit(1)
 
     root = tk.Tk()
-    app = AssistantUI(root)
+    app = AssistantUI(root, ui_config)
     
     # Start the network listener in a separate thread so it doesn't block the GUI
     server_thread = threading.Thread(target=run_server, args=(host, port, app.message_queue), daemon=True)
@@ -0,0 +1,118 @@
+"""
+Frame-level voice activity detection for the mic service.
+
+Two engines decide whether a single frame contains speech:
+  energy  - built in. Compares speech-band (300-3400 Hz) power against a
+            per-frequency noise floor that keeps adapting while nobody talks
+            (spectral gating), so a fan or a TV doesn't count as speech.
+  webrtc  - the WebRTC VAD from the optional webrtcvad package.
+On top of the engine, VoiceActivityDetector smooths decisions with an onset
+requirement and a hangover, and holds the endpointing settings from the
+'vad' section of config.yaml.
+"""
+import numpy as np
+
+SPEECH_BAND_HZ = (300, 3400)
+
+class SpectralGateEngine:
+    """Speech-band energy above an adaptive, per-frequency noise floor."""
+    def __init__(self, vad_config, rate, frame_samples):
+        self.threshold = 10 ** (vad_config['threshold_db'] / 10)
+        freqs = np.fft.rfftfreq(frame_samples, d=1.0 / rate)
+        self.band = (freqs >= SPEECH_BAND_HZ[0]) & (freqs <= SPEECH_BAND_HZ[1])
+        self.window = np.hanning(frame_samples).astype(np.float32)
+        self.noise = None
+        # Noise floor smoothing: quick to adapt in silence, very slow during speech
+        # so a noise source that starts mid-utterance is still absorbed eventually.
+        self.silence_alpha = 0.95
+        self.speech_alpha = 0.999
+
+    def band_power(self, frame):
+        samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32) * self.window
+        return np.abs(np.fft.rfft(samples))[self.band] ** 2
+
+    def calibrate(self, frames):
+        self.noise = np.median([self.band_power(frame) for frame in frames], axis=0) + 1e-6
+
+    def is_speech(self, frame):
+        power = self.band_power(frame)
+        if self.noise is None:
+            self.noise = power + 1e-6
+            return False
+        # Spectral gate: only power clearly above the noise floor counts.
+        gated = np.maximum(power - 2.0 * self.noise, 0.0).sum()
+        speech = gated / self.noise.sum() > self.threshold
+
+        alpha = self.speech_alpha if speech else self.silence_alpha
+        self.noise = alpha * self.noise + (1 - alpha) * power + 1e-6
+        return speech
+
+class WebRTCEngine:
+    """Wraps webrtcvad, which only accepts 10, 20 or 30 ms frames."""
+    def __init__(self, vad_config, rate, frame_samples):
+        import webrtcvad
+        self.vad = webrtcvad.Vad(vad_config['webrtc_aggressiveness'])
+        self.rate = rate
+
+    def calibrate(self, frames):
+        pass # The WebRTC VAD keeps its own noise model.
+
+    def is_speech(self, frame):
+        return self.vad.is_speech(frame, self.rate)
+
+class VoiceActivityDetector:
+    """
+    Turns per-frame decisions into a stable speaking/not-speaking state.
+    Speech starts after onset_frames consecutive speech frames and continues
+    through dips shorter than the hangover.
+    """
+    def __init__(self, vad_config, rate):
+        frame_ms = vad_config['frame_ms']
+        self.frame_samples = int(rate * frame_ms / 1000)
+        self.onset_frames = vad_config['onset_frames']
+        self.hangover_frames = max(1, vad_config['hangover_ms'] // frame_ms)
+        self.end_of_speech_frames = max(1, vad_config['end_of_speech_ms'] // frame_ms)
+        self.trailing_frames = vad_config['trailing_padding_ms'] // frame_ms
+        self.max_utterance_frames = int(vad_config['max_utterance_seconds'] * 1000 / frame_ms)
+        self.calibration_seconds = vad_config['calibration_seconds']
+
+        engine = vad_config['engine']
+        if engine == "webrtc":
+            try:
+                self.engine = WebRTCEngine(vad_config, rate, self.frame_samples)
+            except ImportError:
+                print("[!] webrtcvad is not installed. Falling back to the energy VAD.")
+                engine = "energy"
+        if engine != "webrtc":
+            self.engine = SpectralGateEngine(vad_config, rate, self.frame_samples)
+        self.engine_name = engine
+        self.reset()
+
+    def reset(self, active=False):
+        """
+        Clears the smoothing state between utterances. active=True starts in
+        the speaking state, for speech another detector already picked up.
+        """
+        self.active = active
+        self.speech_run = 0
+        self.hangover = self.hangover_frames if active else 0
+
+    def calibrate(self, frames):
+        self.engine.calibrate(frames)
+
+    def update(self, frame):
+        """Feeds one frame and returns True while the user is speaking."""
+        speech = self.engine.is_speech(frame)
+        self.speech_run = self.speech_run + 1 if speech else 0
+
+        if not self.active:
+            if self.speech_run >= self.onset_frames:
+                self.active = True
+                self.hangover = self.hangover_frames
+        elif speech:
+            self.hangover = self.hangover_frames
+        else:
+            self.hangover -= 1
+            if self.hangover <= 0:
+                self.active = False
+        return self.active